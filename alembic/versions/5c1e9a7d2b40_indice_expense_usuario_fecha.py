@@ -0,0 +1,34 @@
+"""Indice de expense por usuario y fecha
+
+Revision ID: 5c1e9a7d2b40
+Revises: 1edf3498e79f
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d2b40'
+down_revision: Union[str, Sequence[str], None] = '1edf3498e79f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY para no bloquear escrituras en expense mientras se construye
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_expense_user_id_expense_date', 'expense', ['user_id', 'expense_date'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_expense_user_id_expense_date', table_name='expense', postgresql_concurrently=True)
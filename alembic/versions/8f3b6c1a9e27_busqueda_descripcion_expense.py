@@ -0,0 +1,34 @@
+"""Busqueda de texto en descripcion de expense
+
+Revision ID: 8f3b6c1a9e27
+Revises: 5c1e9a7d2b40
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b6c1a9e27'
+down_revision: Union[str, Sequence[str], None] = '5c1e9a7d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Misma expresion que models.VECTOR_DESCRIPCION
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_expense_description_fts ON expense "
+            "USING gin (to_tsvector('spanish'::regconfig, coalesce(description, '')))"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_expense_description_fts")
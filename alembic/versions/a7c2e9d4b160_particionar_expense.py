@@ -0,0 +1,141 @@
+"""Particionar expense por rango de expense_date (mensual)
+
+Revision ID: a7c2e9d4b160
+Revises: f6a1d3c7e954
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c2e9d4b160'
+down_revision: Union[str, Sequence[str], None] = 'f6a1d3c7e954'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 10000
+MESES_FUTUROS = 3
+
+# Indices de la tabla nueva: se crean vacios con nombre temporal y se renombran al final
+INDICES = [
+    ('ix_expense_id', 'CREATE INDEX {nombre} ON expense_particionada (id)'),
+    ('ix_expense_user_id_expense_date', 'CREATE INDEX {nombre} ON expense_particionada (user_id, expense_date)'),
+    ('ix_expense_recurring_source_period',
+     'CREATE UNIQUE INDEX {nombre} ON expense_particionada (recurring_source_id, recurring_period, expense_date)'),
+    ('ix_expense_description_fts',
+     "CREATE INDEX {nombre} ON expense_particionada USING gin (to_tsvector('spanish'::regconfig, coalesce(description, '')))"),
+]
+
+# Mientras se copian los lotes, los cambios en expense se repiten en la tabla nueva
+COPIAR_CAMBIOS = """
+CREATE FUNCTION expense_copiar_cambios() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM expense_particionada WHERE id = OLD.id AND expense_date = OLD.expense_date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO expense_particionada SELECT (NEW).*;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# FOR SHARE: una edicion en curso termina antes de copiar la fila, y su trigger la deja al dia
+COPIAR_LOTE = """
+WITH lote AS (
+    SELECT * FROM expense WHERE id > :desde ORDER BY id LIMIT :lote FOR SHARE
+), copiadas AS (
+    INSERT INTO expense_particionada SELECT * FROM lote ON CONFLICT DO NOTHING
+)
+SELECT id FROM lote ORDER BY id DESC LIMIT 1
+"""
+
+
+def mes_siguiente(fecha: datetime.date) -> datetime.date:
+    return datetime.date(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1)
+
+
+def crear_particiones(conexion) -> None:
+    desde = conexion.execute(sa.text('SELECT min(expense_date) FROM expense')).scalar() or datetime.datetime.now()
+    mes = desde.date().replace(day=1)
+    hasta = datetime.date.today().replace(day=1)
+    for _ in range(MESES_FUTUROS):
+        hasta = mes_siguiente(hasta)
+    while mes <= hasta:
+        op.execute(
+            f"CREATE TABLE expense_p{mes.year:04d}_{mes.month:02d} PARTITION OF expense_particionada "
+            f"FOR VALUES FROM ('{mes}') TO ('{mes_siguiente(mes)}')"
+        )
+        mes = mes_siguiente(mes)
+    op.execute('CREATE TABLE expense_p_default PARTITION OF expense_particionada DEFAULT')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conexion = op.get_bind()
+
+    # expense_date pasa a ser parte de la PK: no puede quedar en NULL
+    op.execute('UPDATE expense SET expense_date = coalesce(created_at, now()) WHERE expense_date IS NULL')
+
+    op.execute(
+        'CREATE TABLE expense_particionada (LIKE expense INCLUDING DEFAULTS) PARTITION BY RANGE (expense_date)'
+    )
+    op.execute('ALTER TABLE expense_particionada ALTER COLUMN expense_date SET NOT NULL')
+    op.execute('ALTER TABLE expense_particionada ADD CONSTRAINT expense_particionada_pkey PRIMARY KEY (id, expense_date)')
+    op.execute('ALTER TABLE expense_particionada ADD CONSTRAINT expense_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id)')
+    op.execute('ALTER TABLE expense_particionada ADD CONSTRAINT expense_category_id_fkey FOREIGN KEY (category_id) REFERENCES category (id)')
+    for nombre, crear in INDICES:
+        op.execute(crear.format(nombre=f'{nombre}_nuevo'))
+    crear_particiones(conexion)
+
+    op.execute(COPIAR_CAMBIOS)
+    op.execute(
+        'CREATE TRIGGER expense_copiar_cambios AFTER INSERT OR UPDATE OR DELETE ON expense '
+        'FOR EACH ROW EXECUTE FUNCTION expense_copiar_cambios()'
+    )
+
+    # Copia en linea: cada lote es su propia transaccion, la app sigue escribiendo en expense
+    with op.get_context().autocommit_block():
+        conexion = op.get_bind()
+        desde = '00000000-0000-0000-0000-000000000000'
+        while True:
+            ultimo = conexion.execute(sa.text(COPIAR_LOTE), {'desde': desde, 'lote': LOTE}).scalar()
+            if ultimo is None:
+                break
+            desde = ultimo
+
+    # Cambio de tablas: bloqueo corto, las filas ya estan copiadas
+    op.execute('LOCK TABLE expense IN ACCESS EXCLUSIVE MODE')
+    op.execute('DROP TRIGGER expense_copiar_cambios ON expense')
+    op.execute('DROP FUNCTION expense_copiar_cambios()')
+    op.execute('DROP TABLE expense')
+    op.execute('ALTER TABLE expense_particionada RENAME TO expense')
+    op.execute('ALTER TABLE expense RENAME CONSTRAINT expense_particionada_pkey TO expense_pkey')
+    for nombre, _ in INDICES:
+        op.execute(f'ALTER INDEX {nombre}_nuevo RENAME TO {nombre}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Vuelta a una tabla comun con copia completa (requiere ventana de mantenimiento)
+    op.execute('CREATE TABLE expense_sin_particionar (LIKE expense INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO expense_sin_particionar SELECT * FROM expense')
+    op.execute('DROP TABLE expense CASCADE')
+    op.execute('ALTER TABLE expense_sin_particionar RENAME TO expense')
+    op.execute('ALTER TABLE expense ALTER COLUMN expense_date DROP NOT NULL')
+    op.execute('ALTER TABLE expense ADD CONSTRAINT expense_pkey PRIMARY KEY (id)')
+    op.execute('ALTER TABLE expense ADD CONSTRAINT expense_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id)')
+    op.execute('ALTER TABLE expense ADD CONSTRAINT expense_category_id_fkey FOREIGN KEY (category_id) REFERENCES category (id)')
+    op.execute('CREATE INDEX ix_expense_id ON expense (id)')
+    op.execute('CREATE INDEX ix_expense_user_id_expense_date ON expense (user_id, expense_date)')
+    op.execute('CREATE UNIQUE INDEX ix_expense_recurring_source_period ON expense (recurring_source_id, recurring_period)')
+    op.execute(
+        "CREATE INDEX ix_expense_description_fts ON expense "
+        "USING gin (to_tsvector('spanish'::regconfig, coalesce(description, '')))"
+    )
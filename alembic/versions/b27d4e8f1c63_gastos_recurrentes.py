@@ -0,0 +1,43 @@
+"""Gastos recurrentes: instancias por periodo y avance de la tarea
+
+Revision ID: b27d4e8f1c63
+Revises: 8f3b6c1a9e27
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b27d4e8f1c63'
+down_revision: Union[str, Sequence[str], None] = '8f3b6c1a9e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('expense', sa.Column('recurring_source_id', sa.UUID(), nullable=True))
+    op.add_column('expense', sa.Column('recurring_period', sa.String(), nullable=True))
+    op.create_index('ix_expense_recurring_source_period', 'expense', ['recurring_source_id', 'recurring_period'], unique=True)
+    op.create_table('recurring_run',
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('last_source_id', sa.String(), nullable=True),
+    sa.Column('batches', sa.Integer(), nullable=True),
+    sa.Column('inserted', sa.Integer(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('period')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recurring_run')
+    op.drop_index('ix_expense_recurring_source_period', table_name='expense')
+    op.drop_column('expense', 'recurring_period')
+    op.drop_column('expense', 'recurring_source_id')
@@ -0,0 +1,66 @@
+"""Archivo de gastos viejos y totales mensuales archivados
+
+Revision ID: c5e8f2a1d734
+Revises: a7c2e9d4b160
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8f2a1d734'
+down_revision: Union[str, Sequence[str], None] = 'a7c2e9d4b160'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expense_archive',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('category_id', sa.UUID(), nullable=True),
+    sa.Column('expense_date', sa.DateTime(), nullable=True),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_expense_archive_user_id_expense_date', 'expense_archive', ['user_id', 'expense_date'], unique=False)
+    op.create_table('expense_rollup',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('category_id', sa.UUID(), nullable=True),
+    sa.Column('month', sa.Date(), nullable=True),
+    sa.Column('total_cents', sa.BigInteger(), nullable=True),
+    sa.Column('expense_count', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_expense_rollup_user_month_category', 'expense_rollup', ['user_id', 'month', 'category_id'], unique=True)
+    op.create_table('expense_archive_run',
+    sa.Column('horizon', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('batches', sa.Integer(), nullable=True),
+    sa.Column('moved', sa.Integer(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('horizon')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Los gastos archivados vuelven a expense antes de borrar el archivo
+    op.execute(
+        'INSERT INTO expense (id, user_id, category_id, expense_date, amount_cents, description, is_recurring) '
+        'SELECT id, user_id, category_id, expense_date, amount_cents, description, false FROM expense_archive'
+    )
+    op.drop_table('expense_archive_run')
+    op.drop_index('ix_expense_rollup_user_month_category', table_name='expense_rollup')
+    op.drop_table('expense_rollup')
+    op.drop_index('ix_expense_archive_user_id_expense_date', table_name='expense_archive')
+    op.drop_table('expense_archive')
@@ -0,0 +1,37 @@
+"""Tabla app_log para registros de acceso y auditoria
+
+Revision ID: d81b4f6c2a95
+Revises: c5e8f2a1d734
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81b4f6c2a95'
+down_revision: Union[str, Sequence[str], None] = 'c5e8f2a1d734'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('app_log',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('kind', sa.String(), nullable=True),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_app_log_created_at'), 'app_log', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_app_log_created_at'), table_name='app_log')
+    op.drop_table('app_log')
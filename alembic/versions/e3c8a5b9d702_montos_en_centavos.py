@@ -0,0 +1,42 @@
+"""Montos en centavos (bigint)
+
+Revision ID: e3c8a5b9d702
+Revises: d94a2f6e0b18
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c8a5b9d702'
+down_revision: Union[str, Sequence[str], None] = 'd94a2f6e0b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabla, columna en double, columna en centavos)
+COLUMNAS = [
+    ('expense', 'amount', 'amount_cents'),
+    ('budget', 'amount_limit', 'amount_limit_cents'),
+    ('alert', 'amount_spent', 'amount_spent_cents'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for tabla, anterior, centavos in COLUMNAS:
+        op.add_column(tabla, sa.Column(centavos, sa.BigInteger(), nullable=True))
+        # round() sobre numeric redondea al entero mas cercano (mitades hacia afuera)
+        op.execute(f'UPDATE "{tabla}" SET {centavos} = round({anterior}::numeric * 100) WHERE {anterior} IS NOT NULL')
+        op.drop_column(tabla, anterior)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla, anterior, centavos in COLUMNAS:
+        op.add_column(tabla, sa.Column(anterior, sa.Double(), nullable=True))
+        op.execute(f'UPDATE "{tabla}" SET {anterior} = {centavos} / 100.0 WHERE {centavos} IS NOT NULL')
+        op.drop_column(tabla, centavos)
@@ -0,0 +1,51 @@
+"""Tablas de atipicos calculados por lotes
+
+Revision ID: f6a1d3c7e954
+Revises: e3c8a5b9d702
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a1d3c7e954'
+down_revision: Union[str, Sequence[str], None] = 'e3c8a5b9d702'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('expense_anomaly',
+    sa.Column('expense_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('flags', sa.String(), nullable=True),
+    sa.Column('message', sa.String(), nullable=True),
+    sa.Column('zscore', sa.Double(), nullable=True),
+    sa.Column('category_share', sa.Double(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('expense_id')
+    )
+    op.create_index(op.f('ix_expense_anomaly_user_id'), 'expense_anomaly', ['user_id'], unique=False)
+    op.create_table('expense_anomaly_user',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('expense_count', sa.Integer(), nullable=True),
+    sa.Column('last_change_at', sa.DateTime(), nullable=True),
+    sa.Column('mean_cents', sa.Double(), nullable=True),
+    sa.Column('std_cents', sa.Double(), nullable=True),
+    sa.Column('median_cents', sa.Double(), nullable=True),
+    sa.Column('p95_cents', sa.Double(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('expense_anomaly_user')
+    op.drop_index(op.f('ix_expense_anomaly_user_id'), table_name='expense_anomaly')
+    op.drop_table('expense_anomaly')
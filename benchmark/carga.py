@@ -0,0 +1,268 @@
+"""Prueba de carga reproducible de la API.
+
+Uso:
+    python -m benchmark.carga --sembrar --clientes 20 --duracion 30 --salida bench.json
+    python -m benchmark.carga --uvicorn --puerto 8001
+    python -m benchmark.carga --url http://localhost:8000
+
+Sin --url ni --uvicorn la app se ejecuta en el mismo proceso (ASGI).
+Todos los clientes salen de la misma IP: usar RATE_LIMIT_ENABLED=false para
+medir las rutas y no el limitador de /login.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmark.semilla import PASSWORD_BENCH, email_bench
+
+# (nombre, peso) de cada operacion de la mezcla
+MEZCLA = [
+    ("login", 5),
+    ("listar_egresos", 30),
+    ("grafico_categoria", 15),
+    ("grafico_mensual", 15),
+    ("atipicos", 15),
+    ("crear_egreso", 20),
+]
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+class Cliente:
+    def __init__(self, http: httpx.AsyncClient, indice: int, rnd: random.Random, categorias: list):
+        self.http = http
+        self.indice = indice
+        self.rnd = rnd
+        self.categorias = categorias
+        self.token = None
+        self.usuario_id = None
+
+    async def login(self):
+        respuesta = await self.http.post("/login", json={
+            "username": email_bench(self.indice),
+            "password": f"{PASSWORD_BENCH}{self.indice}"
+        })
+        cuerpo = respuesta.json()
+        if "token" in cuerpo:
+            self.token = cuerpo["token"]
+            self.usuario_id = cuerpo["data"]["id"]
+        return respuesta
+
+    async def ejecutar(self, operacion: str):
+        if operacion == "login":
+            return await self.login()
+
+        headers = {"x-token": self.token}
+        if operacion == "listar_egresos":
+            return await self.http.get(f"/egresos/usuario/{self.usuario_id}", headers=headers)
+        if operacion == "grafico_categoria":
+            return await self.http.get(f"/egresos/grafico/categoria/{self.usuario_id}", headers=headers)
+        if operacion == "grafico_mensual":
+            return await self.http.get(f"/egresos/grafico/mensual/{self.usuario_id}", headers=headers)
+        if operacion == "atipicos":
+            return await self.http.get(f"/egresos/{self.usuario_id}/atipicos", headers=headers)
+        if operacion == "crear_egreso":
+            return await self.http.post("/egresos/crear", headers=headers, json={
+                "amount": round(self.rnd.lognormvariate(3.5, 1.0), 2),
+                "expense_date": datetime.datetime.now().isoformat(),
+                "description": "Gasto de carga",
+                "user_id": self.usuario_id,
+                "category_id": self.rnd.choice(self.categorias)
+            })
+        raise ValueError(operacion)
+
+
+async def correr_cliente(cliente: Cliente, fin: float, latencias: dict, errores: dict):
+    await cliente.login()
+    if not cliente.token:
+        errores["login"] = errores.get("login", 0) + 1
+        return
+
+    nombres = [nombre for nombre, _ in MEZCLA]
+    pesos = [peso for _, peso in MEZCLA]
+    while time.perf_counter() < fin:
+        operacion = cliente.rnd.choices(nombres, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.ejecutar(operacion)
+            ok = respuesta.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        duracion = time.perf_counter() - inicio
+
+        latencias.setdefault(operacion, []).append(duracion * 1000)
+        if not ok:
+            errores[operacion] = errores.get(operacion, 0) + 1
+
+
+async def obtener_categorias(http: httpx.AsyncClient) -> list:
+    cliente = Cliente(http, 0, random.Random(0), [])
+    await cliente.login()
+    respuesta = await http.get("/categorias/", headers={"x-token": cliente.token})
+    return [c["id"] for c in respuesta.json()["data"]]
+
+
+async def correr(http: httpx.AsyncClient, args) -> dict:
+    categorias = await obtener_categorias(http)
+    latencias = {}
+    errores = {}
+
+    inicio = time.perf_counter()
+    fin = inicio + args.duracion
+    clientes = [
+        Cliente(http, i % args.usuarios, random.Random(args.semilla + i), categorias)
+        for i in range(args.clientes)
+    ]
+    await asyncio.gather(*(correr_cliente(c, fin, latencias, errores) for c in clientes))
+    transcurrido = time.perf_counter() - inicio
+
+    rutas = {}
+    for operacion, valores in sorted(latencias.items()):
+        rutas[operacion] = {
+            "peticiones": len(valores),
+            "errores": errores.get(operacion, 0),
+            "rps": round(len(valores) / transcurrido, 2),
+            "media_ms": round(sum(valores) / len(valores), 3),
+            "p50_ms": round(percentil(valores, 50), 3),
+            "p95_ms": round(percentil(valores, 95), 3),
+            "p99_ms": round(percentil(valores, 99), 3),
+        }
+
+    todas = [v for valores in latencias.values() for v in valores]
+    return {
+        "commit": commit_actual(),
+        "fecha": datetime.datetime.now().isoformat(),
+        "config": {
+            "modo": modo(args),
+            "clientes": args.clientes,
+            "usuarios": args.usuarios,
+            "duracion_s": args.duracion,
+            "semilla": args.semilla,
+        },
+        "total": {
+            "peticiones": len(todas),
+            "errores": sum(errores.values()),
+            "rps": round(len(todas) / transcurrido, 2),
+            "p50_ms": round(percentil(todas, 50), 3),
+            "p95_ms": round(percentil(todas, 95), 3),
+            "p99_ms": round(percentil(todas, 99), 3),
+        },
+        "rutas": rutas,
+    }
+
+
+def commit_actual() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def modo(args) -> str:
+    if args.url:
+        return "url"
+    if args.uvicorn:
+        return "uvicorn"
+    return "asgi"
+
+
+def sembrar(args):
+    from database import Base, engine, session
+    from benchmark.semilla import sembrar as sembrar_datos
+
+    Base.metadata.create_all(engine)
+    db = session()
+    try:
+        sembrar_datos(db, args.usuarios, args.egresos, args.semilla)
+    finally:
+        db.close()
+
+
+async def principal(args) -> dict:
+    timeout = httpx.Timeout(60.0)
+    limites = httpx.Limits(max_connections=args.clientes, max_keepalive_connections=args.clientes)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limites) as http:
+            return await correr(http, args)
+
+    if args.uvicorn:
+        url = f"http://127.0.0.1:{args.puerto}"
+        servidor = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", str(args.puerto), "--workers", str(args.workers), "--log-level", "warning"
+        ])
+        try:
+            async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limites) as http:
+                await esperar_servidor(http)
+                return await correr(http, args)
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    from main import app
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    # ASGITransport no ejecuta el lifespan, lo corremos a mano
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=timeout) as http:
+            return await correr(http, args)
+
+
+async def esperar_servidor(http: httpx.AsyncClient, intentos: int = 50):
+    for _ in range(intentos):
+        try:
+            respuesta = await http.get("/salud/listo")
+            if respuesta.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn no respondio a tiempo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument("--url", help="Servidor ya levantado (no se inicia la app)")
+    parser.add_argument("--uvicorn", action="store_true", help="Levanta la app con uvicorn")
+    parser.add_argument("--puerto", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clientes", type=int, default=20, help="Clientes concurrentes")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuarios sembrados a repartir")
+    parser.add_argument("--egresos", type=int, default=200, help="Egresos por usuario al sembrar")
+    parser.add_argument("--duracion", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--sembrar", action="store_true", help="Crea tablas y datos antes de correr")
+    parser.add_argument("--salida", help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        parser.error("DATABASE_URL no esta definida")
+
+    if args.sembrar:
+        sembrar(args)
+
+    reporte = asyncio.run(principal(args))
+    texto = json.dumps(reporte, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
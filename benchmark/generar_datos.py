@@ -0,0 +1,207 @@
+"""Generador de datos sinteticos para pruebas a escala.
+
+Uso:
+    python -m benchmark.generar_datos --escala 10 --semilla 42 --crear-tablas
+
+Escala 1 son 1000 usuarios y ~100 egresos por usuario en promedio, con una
+distribucion de Pareto (pocos usuarios con muchisimos egresos). En PostgreSQL
+se inserta con COPY; en otros motores con executemany por lotes.
+Los usuarios generados inician sesion con email_generado(semilla, i) y
+password_generado(semilla, i); no chocan con los de benchmark.semilla.
+"""
+import argparse
+import csv
+import datetime
+import io
+import os
+import random
+import time
+import uuid
+
+from sqlalchemy import insert
+
+from benchmark.semilla import CATEGORIAS
+from database import Base, engine
+from invalidacion import bus
+from models import User, Category, Expense, Budget, Access_log
+from routers.categorias import CLAVE_CACHE
+
+LOTE = 50_000
+USUARIOS_POR_ESCALA = 1000
+
+
+def email_generado(semilla: int, i: int) -> str:
+    return f"gen{semilla}-{i}@bench.local"
+
+
+def password_generado(semilla: int, i: int) -> str:
+    return f"gen{semilla}-{i}" #password_hash es unico
+
+
+def uuid_det(rnd: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rnd.getrandbits(128), version=4)
+
+
+class Escritor:
+    # Acumula filas por tabla y las vuelca en lotes (COPY o executemany)
+    def __init__(self, conexion, lote: int = LOTE):
+        self.conexion = conexion
+        self.lote = lote
+        self.pendientes = {}
+        self.totales = {}
+        self.es_postgres = conexion.dialect.name == "postgresql"
+
+    def agregar(self, tabla, fila: dict):
+        filas = self.pendientes.setdefault(tabla, [])
+        filas.append(fila)
+        if len(filas) >= self.lote:
+            #Se vuelca todo: las filas hijas pueden apuntar a padres que siguen pendientes
+            self.volcar_todo()
+
+    def volcar(self, tabla):
+        filas = self.pendientes.pop(tabla, [])
+        if not filas:
+            return
+        if self.es_postgres:
+            self._copy(tabla, filas)
+        else:
+            self.conexion.execute(insert(tabla), filas)
+        self.totales[tabla.name] = self.totales.get(tabla.name, 0) + len(filas)
+
+    def volcar_todo(self):
+        # En orden de claves foraneas: categorias y usuarios antes que sus hijas
+        for tabla in Base.metadata.sorted_tables:
+            self.volcar(tabla)
+
+    def _copy(self, tabla, filas: list):
+        columnas = list(filas[0].keys())
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in filas:
+            escritor.writerow(["" if fila[c] is None else fila[c] for c in columnas])
+        buffer.seek(0)
+
+        nombres = ", ".join(f'"{c}"' for c in columnas)
+        cursor = self.conexion.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY "{tabla.name}" ({nombres}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+
+def generar(conexion, escala: float, semilla: int, media_egresos: int, anios: int) -> dict:
+    rnd = random.Random(semilla)
+    fin = datetime.datetime(2026, 1, 1)
+    escritor = Escritor(conexion)
+
+    # Categorias: cada una con su propio nivel de gasto
+    categorias = []
+    for nombre in CATEGORIAS:
+        id_categoria = uuid_det(rnd)
+        categorias.append((id_categoria, rnd.uniform(2.5, 5.0)))
+        escritor.agregar(Category.__table__, {
+            "id": id_categoria,
+            "name": f"{nombre}-{semilla}",
+            "description": nombre,
+            "created_at": fin
+        })
+    escritor.volcar_todo()
+
+    # Pareto con alfa 1.5 tiene media 3 * xm
+    xm = media_egresos / 3
+    maximo_egresos = media_egresos * 200
+    dias_historia = anios * 365
+
+    usuarios = int(USUARIOS_POR_ESCALA * escala)
+    for i in range(usuarios):
+        id_usuario = uuid_det(rnd)
+        alta = fin - datetime.timedelta(days=rnd.randint(0, dias_historia))
+        escritor.agregar(User.__table__, {
+            "id": id_usuario,
+            "full_name": f"Usuario {semilla}-{i}",
+            "email": email_generado(semilla, i),
+            "password_hash": password_generado(semilla, i),
+            "role": "user",
+            "is_active": True,
+            "email_verified": True,
+            "created_at": alta,
+            "updated_at": alta
+        })
+
+        # Cada usuario concentra su gasto en pocas categorias
+        preferidas = rnd.sample(categorias, k=rnd.randint(2, 5))
+        pesos = [rnd.paretovariate(1.0) for _ in preferidas]
+
+        egresos = min(maximo_egresos, int(rnd.paretovariate(1.5) * xm))
+        for _ in range(egresos):
+            id_categoria, mu = rnd.choices(preferidas, pesos)[0]
+            # Mas egresos recientes que antiguos
+            dias = min(dias_historia, int(rnd.expovariate(1 / (dias_historia / 4))))
+            fecha = fin - datetime.timedelta(days=dias, seconds=rnd.randint(0, 86_399))
+            escritor.agregar(Expense.__table__, {
+                "id": uuid_det(rnd),
+                "amount_cents": round(rnd.lognormvariate(mu, 0.8) * 100),
+                "expense_date": fecha,
+                "description": f"Gasto {rnd.randint(1, 50_000)}",
+                "is_recurring": rnd.random() < 0.05,
+                "created_at": fecha,
+                "updated_at": fecha,
+                "user_id": id_usuario,
+                "category_id": id_categoria
+            })
+
+        for id_categoria, mu in preferidas:
+            for meses_atras in range(rnd.randint(0, 12)):
+                mes = (fin.month - meses_atras - 1) % 12 + 1
+                anio = fin.year + (fin.month - meses_atras - 1) // 12
+                escritor.agregar(Budget.__table__, {
+                    "id": uuid_det(rnd),
+                    "amount_limit_cents": round(rnd.lognormvariate(mu, 0.5) * 2000),
+                    "month": str(mes),
+                    "year": str(anio),
+                    "alert_treshold": rnd.choice([0.5, 0.8, 0.9]),
+                    "created_at": fin,
+                    "updated_at": fin,
+                    "user_id": id_usuario,
+                    "category_id": id_categoria
+                })
+
+        for _ in range(rnd.randint(0, 10)):
+            escritor.agregar(Access_log.__table__, {
+                "id": f"{rnd.getrandbits(256):064x}",
+                "last_login": fin - datetime.timedelta(minutes=rnd.randint(0, 60 * 24 * 90)),
+                "user_id": id_usuario
+            })
+
+    escritor.volcar_todo()
+    return escritor.totales
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sinteticos a escala")
+    parser.add_argument("--escala", type=float, default=1.0, help="1 = 1000 usuarios")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--media-egresos", type=int, default=100, help="Egresos promedio por usuario")
+    parser.add_argument("--anios", type=int, default=3, help="Anios de historia")
+    parser.add_argument("--crear-tablas", action="store_true")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        parser.error("DATABASE_URL no esta definida")
+
+    if args.crear_tablas:
+        Base.metadata.create_all(engine)
+
+    inicio = time.perf_counter()
+    with engine.begin() as conexion:
+        totales = generar(conexion, args.escala, args.semilla, args.media_egresos, args.anios)
+    bus.publicar(CLAVE_CACHE) #Categorias nuevas para los workers en marcha (PostgreSQL)
+    duracion = time.perf_counter() - inicio
+
+    for tabla, total in totales.items():
+        print(f"{tabla}: {total} filas")
+    print(f"Tiempo: {duracion:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
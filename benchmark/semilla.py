@@ -0,0 +1,66 @@
+import random
+import datetime
+import uuid
+
+from invalidacion import bus
+from models import User, Category, Expense
+from routers.categorias import CLAVE_CACHE
+
+CATEGORIAS = [
+    "Alimentacion", "Transporte", "Vivienda", "Servicios", "Salud",
+    "Educacion", "Entretenimiento", "Ropa", "Viajes", "Otros"
+]
+
+PASSWORD_BENCH = "bench"
+
+
+def email_bench(i: int) -> str:
+    return f"bench{i}@bench.local"
+
+
+def sembrar(db, usuarios: int = 20, egresos_por_usuario: int = 200, semilla: int = 42):
+    # Datos minimos y deterministas para que las corridas sean comparables
+    rnd = random.Random(semilla)
+    ahora = datetime.datetime(2026, 1, 1)
+
+    categorias = []
+    for nombre in CATEGORIAS:
+        categoria = db.query(Category).filter(Category.name == nombre).first()
+        if not categoria:
+            categoria = Category(id=uuid.uuid4(), name=nombre, description=nombre, created_at=ahora)
+            db.add(categoria)
+        categorias.append(categoria)
+    db.flush()
+
+    for i in range(usuarios):
+        if db.query(User).filter(User.email == email_bench(i)).first():
+            continue
+
+        usuario = User(
+            id=uuid.uuid4(),
+            full_name=f"Bench {i}",
+            email=email_bench(i),
+            password_hash=f"{PASSWORD_BENCH}{i}", #password_hash es unico
+            role="user",
+            is_active=True,
+            email_verified=True,
+            created_at=ahora
+        )
+        db.add(usuario)
+
+        for _ in range(egresos_por_usuario):
+            fecha = ahora - datetime.timedelta(days=rnd.randint(0, 730), minutes=rnd.randint(0, 1439))
+            db.add(Expense(
+                id=uuid.uuid4(),
+                amount_cents=round(rnd.lognormvariate(3.5, 1.0) * 100),
+                expense_date=fecha,
+                description=f"Gasto {rnd.randint(1, 10_000)}",
+                is_recurring=rnd.random() < 0.05,
+                created_at=fecha,
+                updated_at=fecha,
+                user_id=usuario.id,
+                category_id=rnd.choice(categorias).id
+            ))
+
+    db.commit()
+    bus.publicar(CLAVE_CACHE) #Puede haber categorias nuevas
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from invalidacion import bus
+
+#Limites del cache de respuestas analiticas: lo que se pase primero
+ENTRADAS_ANALITICA = int(os.getenv("ANALYTICS_CACHE_ENTRIES", "10000"))
+BYTES_ANALITICA = int(float(os.getenv("ANALYTICS_CACHE_MB", "64")) * 1024 * 1024)
+
+
+class Cache:
+    # Cache en memoria del proceso para datos de referencia
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str):
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return None
+        valor, vence = entrada
+        if vence is not None and vence < time.monotonic():
+            return None
+        return valor
+
+    def guardar(self, clave: str, valor, ttl: float | None = None):
+        # ttl en segundos: para datos que pueden cambiar por fuera de la app (ej. SQL directo)
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl if ttl else None)
+
+    def invalidar(self, clave: str):
+        # "usuario:1" invalida tambien "usuario:1:grafico"; "*" invalida todo
+        with self._lock:
+            if clave == "*":
+                self._datos.clear()
+                return
+            self._datos.pop(clave, None)
+            prefijo = clave + ":"
+            for existente in [c for c in self._datos if c.startswith(prefijo)]:
+                del self._datos[existente]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+class CacheAnalitica:
+    # LRU acotado en entradas y bytes para respuestas por usuario (graficos, atipicos).
+    # Cada entrada guarda la version de datos del usuario con la que se calculo: al
+    # escribir se sube la version y lo viejo deja de servirse sin recorrer el cache
+    def __init__(self, maximo_entradas: int, maximo_bytes: int):
+        self.maximo_entradas = maximo_entradas
+        self.maximo_bytes = maximo_bytes
+        self._datos = OrderedDict() #(user_id, nombre) -> (version, cuerpo)
+        #user_id -> (version, instante del cambio), del cambio mas viejo al mas nuevo. Las
+        #versiones salen de un contador global y se acotan como el LRU: el usuario que sale
+        #queda con _piso, que nunca baja, asi que no vuelve a una version ya cacheada
+        self._versiones = OrderedDict()
+        self._contador = 0
+        self._piso = 0
+        self._cambio_piso = float("-inf") #Ultimo cambio de los usuarios que ya no se siguen
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def version(self, user_id) -> int:
+        return self._versiones.get(str(user_id), (self._piso,))[0]
+
+    def segundos_desde_cambio(self, user_id) -> float:
+        # Desde la ultima escritura conocida del usuario (o de todos, con "*")
+        _, instante = self._versiones.get(str(user_id), (None, self._cambio_piso))
+        return time.monotonic() - instante
+
+    def obtener(self, user_id, nombre: str) -> bytes | None:
+        clave = (str(user_id), nombre)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] != self.version(user_id):
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, user_id, nombre: str, version: int, cuerpo: bytes):
+        # version se lee antes de calcular: si hubo una escritura en el medio, la entrada nace vieja
+        if len(cuerpo) > self.maximo_bytes:
+            return
+        clave = (str(user_id), nombre)
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+            self._datos[clave] = (version, cuerpo)
+            self._bytes += len(cuerpo)
+            while len(self._datos) > self.maximo_entradas or self._bytes > self.maximo_bytes:
+                _, (_, viejo) = self._datos.popitem(last=False)
+                self._bytes -= len(viejo)
+                self.desalojos += 1
+
+    def invalidar(self, clave: str):
+        if clave == "*":
+            with self._lock:
+                self._contador += 1
+                self._piso = self._contador
+                self._cambio_piso = time.monotonic()
+                self._versiones.clear()
+        elif clave.startswith("usuario:"):
+            user_id = clave.split(":")[1]
+            with self._lock:
+                self._contador += 1
+                self._versiones.pop(user_id, None)
+                self._versiones[user_id] = (self._contador, time.monotonic())
+                while len(self._versiones) > self.maximo_entradas:
+                    _, (version, instante) = self._versiones.popitem(last=False)
+                    self._piso = version #Es la mas nueva de las que salieron
+                    self._cambio_piso = instante
+
+    def metricas(self) -> dict:
+        return {
+            "entradas": len(self._datos),
+            "bytes": self._bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "usuarios_versionados": len(self._versiones),
+        }
+
+
+cache = Cache()
+bus.suscribir(cache.invalidar)
+
+cache_analitica = CacheAnalitica(ENTRADAS_ANALITICA, BYTES_ANALITICA)
+bus.suscribir(cache_analitica.invalidar)
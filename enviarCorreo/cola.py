@@ -0,0 +1,81 @@
+import os
+import queue
+import threading
+import time
+
+TAMANO_COLA = int(os.getenv("EMAIL_QUEUE_SIZE", "20000"))
+#Envios por segundo, para no pasar el limite del proveedor (Resend)
+POR_SEGUNDO = float(os.getenv("EMAIL_RATE_PER_SECOND", "5"))
+#Al apagar se sigue enviando a lo sumo este tiempo; lo que quede se descarta y se cuenta
+TIEMPO_DRENADO = float(os.getenv("EMAIL_DRAIN_TIMEOUT", "10"))
+
+
+class ColaCorreos:
+    # Un hilo envia los correos en segundo plano; las rutas solo encolan
+    def __init__(self):
+        self.cola = queue.Queue(maxsize=TAMANO_COLA)
+        self.enviados = 0
+        self.fallidos = 0
+        self.descartados = 0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def encolar(self, funcion, *argumentos) -> bool:
+        try:
+            self.cola.put_nowait((funcion, argumentos))
+            return True
+        except queue.Full:
+            self.descartados += 1
+            return False
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._correr, name="correos", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join()
+        self._hilo = None
+
+    def _correr(self):
+        limite = None
+        while True:
+            if self._detener.is_set() and limite is None:
+                limite = time.monotonic() + TIEMPO_DRENADO
+            if limite is not None and time.monotonic() > limite:
+                break
+            try:
+                funcion, argumentos = self.cola.get(timeout=0.5)
+            except queue.Empty:
+                if limite is not None:
+                    return #Apagando y sin pendientes
+                continue
+            try:
+                funcion(*argumentos)
+                self.enviados += 1
+            except Exception:
+                self.fallidos += 1
+            time.sleep(1 / POR_SEGUNDO)
+
+        while True:
+            try:
+                self.cola.get_nowait()
+                self.descartados += 1
+            except queue.Empty:
+                return
+
+    def metricas(self) -> dict:
+        return {
+            "pendientes": self.cola.qsize(),
+            "enviados": self.enviados,
+            "fallidos": self.fallidos,
+            "descartados": self.descartados,
+        }
+
+
+cola_correos = ColaCorreos()
@@ -2,19 +2,41 @@ import os
 from dotenv import load_dotenv
 import resend 
 
-# Cargar variables del .env
-load_dotenv()
+frontend_url = None
+plantillas = {}
 
-api_key = os.getenv("RESEND_API_KEY")
-frontend_url = os.getenv("FRONTEND_URL")
+#Las rutas de las plantillas son relativas a la raiz del proyecto, no al directorio de trabajo
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-resend.api_key = api_key
+PLANTILLAS = [
+    "templates/recuperacion.html",
+    "templates/nuevaContra.html",
+    "templates/iniciosesion.html"
+]
+
+def configurar():
+    # Se llama una vez al iniciar la app (lifespan), no al importar
+    global frontend_url
+
+    # Cargar variables del .env
+    load_dotenv()
+
+    resend.api_key = os.getenv("RESEND_API_KEY")
+    frontend_url = os.getenv("FRONTEND_URL")
+
+    for ruta in PLANTILLAS:
+        with open(os.path.join(RAIZ, ruta), "r", encoding="utf-8") as file:
+            plantillas[ruta] = file.read()
+
+def leer_plantilla(ruta: str) -> str:
+    if not plantillas:
+        configurar()
+    return plantillas[ruta]
 
 def enviar_correo_recuperacion(destinatario: str, token: str):
-    link = f"{frontend_url}#/cambiar-contra?token={token}"
+    html_content = leer_plantilla("templates/recuperacion.html")
 
-    with open("templates/recuperacion.html", "r", encoding="utf-8") as file:
-        html_content = file.read()
+    link = f"{frontend_url}#/cambiar-contra?token={token}"
 
     # Reemplazar el link del botón por el dinámico
     html_content = html_content.replace(
@@ -30,8 +52,7 @@ def enviar_correo_recuperacion(destinatario: str, token: str):
     })
 
 def enviar_correo_contraseña(destinatario: str, contra: str):
-    with open("templates/nuevaContra.html", "r", encoding="utf-8") as file:
-        html_content = file.read()
+    html_content = leer_plantilla("templates/nuevaContra.html")
 
     html_content = html_content.replace(
         "{{contraseña}}",
@@ -46,8 +67,7 @@ def enviar_correo_contraseña(destinatario: str, contra: str):
     }) 
 
 def enviar_correo_confirmacion(destinatario: str):
-    with open("templates/iniciosesion.html", "r", encoding="utf-8") as file:
-       html_content = file.read()
+    html_content = leer_plantilla("templates/iniciosesion.html")
 
     html_content = html_content.replace(
         "{{ link }}",
@@ -0,0 +1,129 @@
+import datetime
+import hashlib
+import os
+import random
+
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import get_db, token_de
+from models import IdempotencyKey
+
+DURACION = datetime.timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+#Una reserva "en_curso" mas vieja que esto se considera abandonada (proceso caido)
+ABANDONO = datetime.timedelta(seconds=60)
+
+
+class Idempotencia:
+    def __init__(self, db: Session, registro: IdempotencyKey | None = None, repetida=None):
+        self.db = db
+        self.registro = registro
+        self.repetida = repetida #JSONResponse ya guardada, si es un reintento
+        self.completada = False
+
+    def guardar(self, respuesta: dict, status_code: int = 200) -> dict:
+        # Se llama antes del commit de la ruta: escritura y respuesta en la misma transaccion
+        if self.registro is not None:
+            self.registro.status = "completado"
+            self.registro.status_code = status_code
+            self.registro.response_body = respuesta
+        self.completada = True
+        return respuesta
+
+
+def huella(*partes: str) -> str:
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def respuesta_guardada(registro: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        content=registro.response_body,
+        status_code=registro.status_code,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def reservar(db: Session, id_clave: str, hash_peticion: str) -> Idempotencia:
+    ahora = datetime.datetime.now()
+    if random.random() < 0.01:
+        purgar(db, ahora)
+
+    for _ in range(2):
+        try:
+            registro = IdempotencyKey(
+                id=id_clave,
+                request_hash=hash_peticion,
+                status="en_curso",
+                created_at=ahora,
+                expires_at=ahora + DURACION
+            )
+            db.add(registro)
+            db.commit() #La PK serializa los duplicados concurrentes
+            return Idempotencia(db, registro)
+        except IntegrityError:
+            db.rollback()
+
+        existente = db.query(IdempotencyKey).filter(IdempotencyKey.id == id_clave).first()
+        if existente is None:
+            continue #Se borro entre medio, reintentar la reserva
+
+        if existente.request_hash != hash_peticion:
+            raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra solicitud")
+
+        if existente.status == "completado" and existente.expires_at > ahora:
+            return Idempotencia(db, repetida=respuesta_guardada(existente))
+
+        if existente.status == "en_curso" and existente.created_at > ahora - ABANDONO:
+            raise HTTPException(
+                status_code=409,
+                detail="Solicitud con la misma Idempotency-Key en curso",
+                headers={"Retry-After": "1"}
+            )
+
+        #Vencida o abandonada: se toma de nuevo
+        db.delete(existente)
+        db.commit()
+
+    raise HTTPException(status_code=409, detail="No se pudo reservar la Idempotency-Key", headers={"Retry-After": "1"})
+
+
+def liberar(db: Session, registro: IdempotencyKey):
+    # La ruta fallo: se borra la reserva para que el reintento se ejecute
+    db.rollback()
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.id == registro.id,
+        IdempotencyKey.status == "en_curso"
+    ).delete()
+    db.commit()
+
+
+def purgar(db: Session, ahora: datetime.datetime):
+    db.query(IdempotencyKey).filter(IdempotencyKey.expires_at < ahora).delete()
+    db.commit()
+
+
+async def idempotencia(
+    request: Request,
+    idempotency_key: str | None = Header(None),
+    db: Session = Depends(get_db)
+):
+    # Dependencia para POST que crean filas; sin cabecera no hace nada
+    if not idempotency_key:
+        yield Idempotencia(db)
+        return
+
+    id_clave = huella(request.url.path, token_de(request) or "", idempotency_key)
+    hash_peticion = huella(request.method, (await request.body()).decode("utf-8", "replace"))
+    contexto = reservar(db, id_clave, hash_peticion)
+
+    try:
+        yield contexto
+    except Exception:
+        if contexto.registro is not None:
+            liberar(db, contexto.registro)
+        raise
+
+    if contexto.registro is not None and not contexto.completada:
+        liberar(db, contexto.registro)
@@ -0,0 +1,121 @@
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+from database import engine
+
+CANAL = "cache_invalidacion"
+SEPARADOR = ","
+
+logger = logging.getLogger(__name__)
+
+
+def clave_usuario(user_id) -> str:
+    # Todo lo cacheado de un usuario cuelga de esta clave (ej. "usuario:<id>:grafico")
+    return f"usuario:{user_id}"
+
+
+class BusLocal:
+    # Un solo proceso (o tests): las claves se entregan en el mismo proceso
+    def __init__(self):
+        self._suscriptores = []
+
+    def suscribir(self, funcion):
+        self._suscriptores.append(funcion)
+        return funcion
+
+    def publicar(self, *claves):
+        self.entregar(claves)
+
+    def entregar(self, claves):
+        for clave in claves:
+            for funcion in self._suscriptores:
+                funcion(clave)
+
+    def iniciar(self):
+        pass
+
+    def detener(self):
+        pass
+
+
+class BusPostgres(BusLocal):
+    # Varios workers: NOTIFY al publicar y un hilo por proceso haciendo LISTEN
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self.origen = uuid.uuid4().hex[:12]
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def publicar(self, *claves):
+        # Local de inmediato, al resto de workers por NOTIFY
+        self.entregar(claves)
+        payload = f"{self.origen}|{SEPARADOR.join(claves)}"
+        try:
+            with self.engine.connect() as conexion:
+                conexion.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL, "payload": payload})
+                conexion.commit()
+        except Exception:
+            logger.exception("No se pudo publicar la invalidacion %s", claves)
+
+    def iniciar(self):
+        if self._hilo:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._escuchar, name="bus-invalidacion", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+    def _escuchar(self):
+        espera = 0.5
+        while not self._detener.is_set():
+            try:
+                self._escuchar_conexion()
+                espera = 0.5
+            except Exception:
+                logger.exception("Se perdio la conexion LISTEN, reintentando")
+                # Lo que se publico mientras no escuchabamos se perdio: limpiar todo
+                self.entregar(["*"])
+                time.sleep(espera)
+                espera = min(espera * 2, 10)
+
+    def _escuchar_conexion(self):
+        proxy = self.engine.raw_connection()
+        proxy.detach() #Conexion dedicada, no vuelve al pool
+        conexion = proxy.driver_connection
+        try:
+            conexion.autocommit = True
+            cursor = conexion.cursor()
+            cursor.execute(f"LISTEN {CANAL}")
+
+            while not self._detener.is_set():
+                if select.select([conexion], [], [], 1.0) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    notificacion = conexion.notifies.pop(0)
+                    origen, _, claves = notificacion.payload.partition("|")
+                    if origen != self.origen:
+                        self.entregar(claves.split(SEPARADOR))
+        finally:
+            proxy.close()
+
+
+def crear_bus():
+    if engine.dialect.name == "postgresql" and os.getenv("CACHE_BUS", "postgres") != "local":
+        return BusPostgres(engine)
+    return BusLocal()
+
+
+bus = crear_bus()
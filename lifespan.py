@@ -0,0 +1,109 @@
+import asyncio
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+from database import calentar_pool, cerrar_pool, session
+from enviarCorreo.cola import cola_correos
+from enviarCorreo.email import configurar as configurar_correo
+from invalidacion import bus
+from notificaciones import hub
+import registro
+from routers.categorias import cargar_categorias
+
+CONEXIONES_INICIALES = int(os.getenv("DB_POOL_WARMUP", "5"))
+TIEMPO_DRENADO = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+
+
+class Estado:
+    def __init__(self):
+        self.listo = False
+        self.en_vuelo = 0
+
+
+estado = Estado()
+tareas_cierre = []
+
+
+def al_cerrar(funcion):
+    # Registra una funcion que vacia escrituras pendientes antes de cerrar el pool
+    tareas_cierre.append(funcion)
+    return funcion
+
+
+al_cerrar(cola_correos.detener) #Envia los correos pendientes (hasta EMAIL_DRAIN_TIMEOUT)
+
+
+class ContadorPeticiones:
+    # Middleware ASGI: cuenta peticiones en curso para poder drenarlas al apagar
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado.en_vuelo += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            estado.en_vuelo -= 1
+
+
+def escuchar_sigterm():
+    # Al recibir SIGTERM dejamos de estar listos de inmediato y seguimos con
+    # el manejador de uvicorn, que deja de aceptar conexiones
+    try:
+        anterior = signal.getsignal(signal.SIGTERM)
+
+        def manejador(signum, frame):
+            estado.listo = False
+            hub.cerrar_desde_hilo()
+            if callable(anterior):
+                anterior(signum, frame)
+
+        signal.signal(signal.SIGTERM, manejador)
+    except ValueError:
+        pass #Solo se puede desde el hilo principal (ej. TestClient)
+
+
+def primar_caches():
+    db = session()
+    try:
+        cargar_categorias(db)
+    finally:
+        db.close()
+
+
+async def drenar(tiempo_maximo: float):
+    limite = time.monotonic() + tiempo_maximo
+    while estado.en_vuelo > 0 and time.monotonic() < limite:
+        await asyncio.sleep(0.05)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    configurar_correo()
+    registro.iniciar()
+    await run_in_threadpool(calentar_pool, CONEXIONES_INICIALES)
+    await run_in_threadpool(primar_caches)
+    bus.iniciar()
+    hub.iniciar()
+    cola_correos.iniciar()
+    escuchar_sigterm()
+    estado.listo = True
+
+    yield
+
+    estado.listo = False
+    hub.cerrar() #Los streams SSE cuentan como peticiones en vuelo
+    await drenar(TIEMPO_DRENADO)
+    for tarea in tareas_cierre:
+        await run_in_threadpool(tarea)
+    await run_in_threadpool(registro.detener) #Despues de los ganchos, que tambien pueden registrar
+    await run_in_threadpool(bus.detener)
+    cerrar_pool()
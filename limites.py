@@ -0,0 +1,120 @@
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request
+
+
+class TokenBucket:
+    # capacidad: rafaga permitida; por_segundo: ritmo sostenido de recarga
+    def __init__(self, capacidad: float, por_segundo: float, max_claves: int = 50_000):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.max_claves = max_claves
+        self._cubetas = {} #clave -> (tokens, ultimo instante)
+        self._lock = threading.Lock()
+
+    def tomar(self, clave: str):
+        # Devuelve 0 si se permite, o los segundos a esperar si no
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._cubetas.get(clave, (self.capacidad, ahora))
+            tokens = min(self.capacidad, tokens + (ahora - ultimo) * self.por_segundo)
+            if tokens >= 1:
+                self._cubetas[clave] = (tokens - 1, ahora)
+                if len(self._cubetas) > self.max_claves:
+                    self._purgar(ahora)
+                return 0
+            self._cubetas[clave] = (tokens, ahora)
+            return math.ceil((1 - tokens) / self.por_segundo)
+
+    def _purgar(self, ahora: float):
+        # Una cubeta que ya se habria llenado equivale a no tenerla
+        lleno = self.capacidad / self.por_segundo
+        for clave in [c for c, (_, ultimo) in self._cubetas.items() if ahora - ultimo >= lleno]:
+            del self._cubetas[clave]
+
+
+class LimiteConcurrencia:
+    # Tope global de peticiones simultaneas de una clase de ruta; no encola
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self.en_curso = 0
+
+    @asynccontextmanager
+    async def ocupar(self, clase: str):
+        if self.en_curso >= self.maximo:
+            rechazar(clase, "concurrencia", 1)
+        self.en_curso += 1
+        try:
+            yield
+        finally:
+            self.en_curso -= 1
+
+
+#RATE_LIMIT_ENABLED=false para pruebas de carga desde una sola IP
+ACTIVO = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
+CLASES = {
+    #bcrypt por cada login
+    "login": {
+        "ip": TokenBucket(capacidad=20, por_segundo=20 / 60),
+        "cuenta": TokenBucket(capacidad=5, por_segundo=5 / 60),
+        "concurrencia": LimiteConcurrencia(8),
+    },
+    #Envio de correo sincronico a resend
+    "correo": {
+        "ip": TokenBucket(capacidad=10, por_segundo=10 / 60),
+        "cuenta": TokenBucket(capacidad=3, por_segundo=3 / 300),
+        "concurrencia": LimiteConcurrencia(4),
+    },
+}
+
+rechazos = {} #"clase:motivo" -> cantidad
+lock_rechazos = threading.Lock()
+
+
+def rechazar(clase: str, motivo: str, reintentar: int):
+    with lock_rechazos:
+        clave = f"{clase}:{motivo}"
+        rechazos[clave] = rechazos.get(clave, 0) + 1
+    raise HTTPException(
+        status_code=429,
+        detail="Demasiadas solicitudes, intente mas tarde",
+        headers={"Retry-After": str(reintentar)}
+    )
+
+
+def comprobar(clase: str, tipo: str, clave: str):
+    if not ACTIVO:
+        return
+    espera = CLASES[clase][tipo].tomar(clave)
+    if espera:
+        rechazar(clase, tipo, espera)
+
+
+def comprobar_cuenta(clase: str, cuenta: str):
+    # Limite por email/usuario, se llama desde la ruta cuando ya se conoce la cuenta
+    comprobar(clase, "cuenta", cuenta.strip().lower())
+
+
+def limitar(clase: str):
+    # Dependencia: limite por IP y tope de concurrencia de la clase
+    async def dependencia(request: Request):
+        if not ACTIVO:
+            yield
+            return
+        ip = request.client.host if request.client else "desconocida"
+        comprobar(clase, "ip", ip)
+        async with CLASES[clase]["concurrencia"].ocupar(clase):
+            yield
+    return dependencia
+
+
+def metricas() -> dict:
+    return {
+        "rechazos": dict(rechazos),
+        "en_curso": {clase: limites["concurrencia"].en_curso for clase, limites in CLASES.items()}
+    }
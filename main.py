@@ -2,21 +2,29 @@ import time
 import datetime
 import bcrypt
 from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from routers import usuario, egresos, categorias
 from routers import budgets
 from routers import admin
+from routers import salud
+from routers import lote
+from routers import alertas
 
 
 
-from database import get_db
+from database import Adherencia, CABECERA_ADHERENCIA, get_db
 from models import User, Access_log
+from lifespan import lifespan, ContadorPeticiones
+from limites import limitar, comprobar_cuenta
+from registro import RegistroAccesos, auditar
+from perfilado import Perfilador
 
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 
@@ -28,12 +36,20 @@ app.add_middleware(
     CORSMiddleware,
     allow_methods=["*"],
     allow_headers=["*"],
-    allow_origins=origins
+    allow_origins=origins,
+    expose_headers=[CABECERA_ADHERENCIA]
 )
+app.add_middleware(Adherencia)
+app.add_middleware(ContadorPeticiones)
+app.add_middleware(RegistroAccesos)
+app.add_middleware(Perfilador)
 
 app.include_router(usuario.router)
 app.include_router(egresos.router)
 app.include_router(categorias.router)
+app.include_router(salud.router)
+app.include_router(lote.router)
+app.include_router(alertas.router)
 
 class LoginRequest(BaseModel):
     username: str 
@@ -42,20 +58,24 @@ class LoginRequest(BaseModel):
 class LogoutRequest(BaseModel):
     token: str
 
-@app.post("/login")
+@app.post("/login", dependencies=[Depends(limitar("login"))])
 async def login(login_request: LoginRequest, db: Session = Depends(get_db)):
+    comprobar_cuenta("login", login_request.username)
+
     usuario = db.query(User).filter(
         User.email == login_request.username,
         User.password_hash == login_request.password
         ).first()
 
     if not usuario:
+        auditar("sesion.rechazada", email=login_request.username)
         return {"msg": "Usuario no encontrado"}
     
     #Creacion de token
     hora_actual = time.time_ns()
     cadena_a_encriptar = f"{login_request.username}-{str(hora_actual)}" 
-    cadena_hasheada = bcrypt.hashpw(
+    cadena_hasheada = await run_in_threadpool( #bcrypt fuera del event loop
+        bcrypt.hashpw,
         cadena_a_encriptar.encode("utf-8"), 
         bcrypt.gensalt()
         )
@@ -70,6 +90,7 @@ async def login(login_request: LoginRequest, db: Session = Depends(get_db)):
     db.refresh(db_acceso)
 
     db.refresh(usuario)
+    auditar("sesion.iniciada", user_id=usuario.id, email=usuario.email)
 
     return {
         "msg": "Login exitoso",
@@ -87,6 +108,7 @@ async def logout(logout_request: LogoutRequest, db : Session = Depends(get_db)):
     
     db.delete(db_accesos)
     db.commit()
+    auditar("sesion.cerrada", user_id=db_accesos.user_id)
     return {
         "msg" : "Logout exitoso"
     }
@@ -1,6 +1,7 @@
 import uuid
 from database import Base
-from sqlalchemy import UUID, Column, String, DateTime, ForeignKey, Table, Boolean, Double
+from sqlalchemy import UUID, Column, String, Date, DateTime, ForeignKey, Table, Boolean, Double, Integer, BigInteger, JSON, Index, DDL, event, func, literal_column, table, column
+import sqlalchemy.dialects.postgresql #Registra to_tsvector y compania antes de usar func.*
 from sqlalchemy.orm import relationship
 
 class User(Base):
@@ -57,7 +58,7 @@ class Alert(Base):
     )
     alert_type = Column(String)
     percentage_reached = Column(Double)
-    amount_spent = Column(Double)
+    amount_spent_cents = Column(BigInteger) #Centavos
     message = Column(String)
     created_at = Column(DateTime)
 
@@ -96,8 +97,8 @@ class Expense(Base):
         default=lambda: str(uuid.uuid4()),
         index=True
     )
-    amount = Column(Double)
-    expense_date = Column(DateTime)
+    amount_cents = Column(BigInteger) #Centavos
+    expense_date = Column(DateTime, primary_key=True) #Clave de particion en PostgreSQL, tiene que ser parte de la PK
     description = Column(String)
     is_recurring = Column(Boolean)
     created_at = Column(DateTime)
@@ -111,10 +112,52 @@ class Expense(Base):
         UUID(as_uuid=True), 
         ForeignKey("category.id") #Relacion N:1 con Category
         )
+    #Instancias generadas de un gasto recurrente: de que gasto salen y para que periodo (YYYY-MM)
+    recurring_source_id = Column(UUID(as_uuid=True))
+    recurring_period = Column(String)
     
     users = relationship("User", back_populates="expenses")
     categories = relationship("Category", back_populates="expenses")
 
+    __table_args__ = (
+        Index("ix_expense_user_id_expense_date", "user_id", "expense_date"), #Consultas por usuario y rango de fechas
+        #Una instancia por periodo; en una tabla particionada los indices unicos llevan la clave de particion
+        Index("ix_expense_recurring_source_period", "recurring_source_id", "recurring_period", "expense_date", unique=True),
+        {"postgresql_partition_by": "RANGE (expense_date)"}, #Particiones mensuales (tareas/particiones.py)
+    )
+
+#Las filas de meses sin particion van a la de defecto hasta que tareas/particiones.py cree la suya
+event.listen(Expense.__table__, "after_create", DDL(
+    "CREATE TABLE IF NOT EXISTS expense_p_default PARTITION OF expense DEFAULT"
+).execute_if(dialect="postgresql"))
+
+#Misma expresion en el indice GIN y en las consultas, si no PostgreSQL no usa el indice
+VECTOR_DESCRIPCION = "to_tsvector('spanish'::regconfig, coalesce(description, ''))"
+
+def vector_descripcion():
+    return func.to_tsvector(literal_column("'spanish'::regconfig"), func.coalesce(Expense.description, literal_column("''")))
+
+#Busqueda de texto: indice GIN en PostgreSQL
+event.listen(Expense.__table__, "after_create", DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_expense_description_fts ON expense USING gin ({VECTOR_DESCRIPCION})"
+).execute_if(dialect="postgresql"))
+
+#Busqueda de texto: tabla FTS5 sincronizada por triggers en SQLite (pruebas locales)
+expense_fts = table("expense_fts", column("rowid"))
+
+for sentencia in [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expense_fts USING fts5(description, content='expense', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS expense_fts_ai AFTER INSERT ON expense BEGIN "
+    "INSERT INTO expense_fts(rowid, description) VALUES (new.rowid, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expense_fts_ad AFTER DELETE ON expense BEGIN "
+    "INSERT INTO expense_fts(expense_fts, rowid, description) VALUES ('delete', old.rowid, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expense_fts_au AFTER UPDATE ON expense BEGIN "
+    "INSERT INTO expense_fts(expense_fts, rowid, description) VALUES ('delete', old.rowid, old.description); "
+    "INSERT INTO expense_fts(rowid, description) VALUES (new.rowid, new.description); END",
+]:
+    event.listen(Expense.__table__, "after_create", DDL(sentencia).execute_if(dialect="sqlite"))
+event.listen(Expense.__table__, "before_drop", DDL("DROP TABLE IF EXISTS expense_fts").execute_if(dialect="sqlite"))
+
 class Budget(Base):
     __tablename__ = "budget"
     id = Column(
@@ -123,7 +166,7 @@ class Budget(Base):
         default=lambda: str(uuid.uuid4()),
         index=True
     )
-    amount_limit = Column(Double)
+    amount_limit_cents = Column(BigInteger) #Centavos
     month = Column(String)
     year = Column(String)
     alert_treshold = Column(Double)
@@ -141,4 +184,97 @@ class Budget(Base):
     
     users = relationship("User", back_populates="budgets")
     categories = relationship("Category", back_populates="budgets")
-    alerts = relationship("Alert", back_populates="budgets")
\ No newline at end of file
+    alerts = relationship("Alert", back_populates="budgets")
+
+class RecurringRun(Base):
+    # Avance de la tarea de gastos recurrentes por periodo, para poder reanudarla
+    __tablename__ = "recurring_run"
+    period = Column(String, primary_key=True) #YYYY-MM
+    status = Column(String) #en_curso | completado
+    last_source_id = Column(String)
+    batches = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class IdempotencyKey(Base):
+    # Respuesta guardada de un POST con Idempotency-Key, para repetirla en reintentos
+    __tablename__ = "idempotency_key"
+    id = Column(String(64), primary_key=True) #sha256 de ruta + token + clave
+    request_hash = Column(String(64))
+    status = Column(String) #en_curso | completado
+    status_code = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
+
+class ExpenseAnomaly(Base):
+    # Gastos atipicos calculados por la tarea por lotes (tareas/atipicos.py)
+    __tablename__ = "expense_anomaly"
+    expense_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), index=True)
+    flags = Column(String) #Separadas por coma
+    message = Column(String)
+    zscore = Column(Double)
+    category_share = Column(Double) #Fraccion de los gastos del usuario en esa categoria
+    computed_at = Column(DateTime)
+
+class ExpenseAnomalyUser(Base):
+    # Resumen por usuario de la ultima corrida; sirve para saber si los atipicos siguen vigentes
+    __tablename__ = "expense_anomaly_user"
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    expense_count = Column(Integer)
+    last_change_at = Column(DateTime) #max(coalesce(updated_at, created_at)) de sus gastos al calcular
+    mean_cents = Column(Double)
+    std_cents = Column(Double)
+    median_cents = Column(Double)
+    p95_cents = Column(Double)
+    computed_at = Column(DateTime)
+
+class ExpenseArchive(Base):
+    # Gastos anteriores al horizonte, movidos por tareas/archivo.py; solo lo que necesitan las lecturas
+    __tablename__ = "expense_archive"
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True))
+    category_id = Column(UUID(as_uuid=True))
+    expense_date = Column(DateTime)
+    amount_cents = Column(BigInteger) #Centavos
+    description = Column(String)
+    archived_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_expense_archive_user_id_expense_date", "user_id", "expense_date"),
+    )
+
+class ExpenseRollup(Base):
+    # Totales mensuales de lo archivado por usuario y categoria, para los graficos de todo el historial
+    __tablename__ = "expense_rollup"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(UUID(as_uuid=True))
+    category_id = Column(UUID(as_uuid=True))
+    month = Column(Date) #Primer dia del mes
+    total_cents = Column(BigInteger)
+    expense_count = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_expense_rollup_user_month_category", "user_id", "month", "category_id", unique=True),
+    )
+
+class ExpenseArchiveRun(Base):
+    # Corridas del archivo; el mayor horizon es hasta donde puede haber gastos en expense_archive
+    __tablename__ = "expense_archive_run"
+    horizon = Column(DateTime, primary_key=True)
+    status = Column(String) #en_curso | completado
+    batches = Column(Integer, default=0)
+    moved = Column(Integer, default=0)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class AppLog(Base):
+    # Registros de acceso y auditoria cuando LOG_SINK=db (registro.py)
+    __tablename__ = "app_log"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, index=True)
+    kind = Column(String) #acceso | auditoria
+    event = Column(String)
+    data = Column(JSON)
@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+
+from database import session
+from invalidacion import bus
+from models import Alert, Budget, Category, Expense
+from schemas import a_monto
+
+TAMANO_COLA = int(os.getenv("ALERTS_QUEUE_SIZE", "32"))
+#Una conexion que sigue sin leer despues de tantos descartes se cierra; al reconectar recibe el estado completo
+DESCARTES_MAXIMOS = int(os.getenv("ALERTS_MAX_DROPS", "64"))
+INTERVALO_LATIDO = float(os.getenv("ALERTS_HEARTBEAT_SECONDS", "15"))
+
+CIERRE = object() #Marca en la cola: la conexion tiene que terminar
+
+
+def rango_mes(anio: int, mes: int):
+    inicio = datetime.datetime(anio, mes, 1)
+    fin = datetime.datetime(anio + mes // 12, mes % 12 + 1, 1)
+    return inicio, fin
+
+
+def porcentaje_umbral(presupuesto: Budget) -> float:
+    # alert_treshold puede venir como fraccion (0.8) o como porcentaje (80)
+    umbral = presupuesto.alert_treshold or 0
+    return umbral * 100 if umbral <= 1 else umbral
+
+
+def presupuestos_del_mes(db, user_id, anio: int, mes: int, category_id=None):
+    # month se guarda como texto, con o sin cero adelante
+    consulta = db.query(Budget).filter(
+        Budget.user_id == user_id,
+        Budget.year == str(anio),
+        Budget.month.in_([str(mes), f"{mes:02d}"])
+    )
+    if category_id is not None:
+        consulta = consulta.filter(Budget.category_id == category_id)
+    return consulta.all()
+
+
+def gastado(db, presupuesto: Budget, anio: int, mes: int) -> int:
+    inicio, fin = rango_mes(anio, mes)
+    return db.query(func.coalesce(func.sum(Expense.amount_cents), 0)).filter(
+        Expense.user_id == presupuesto.user_id,
+        Expense.category_id == presupuesto.category_id,
+        Expense.expense_date >= inicio,
+        Expense.expense_date < fin
+    ).scalar()
+
+
+def evaluar_presupuesto(db, user_id, category_id, fecha):
+    # Se llama al escribir un egreso, antes del commit: deja el Alert al dia en la misma transaccion
+    if fecha is None or category_id is None:
+        return None
+    if isinstance(fecha, str):
+        fecha = datetime.datetime.fromisoformat(fecha)
+
+    #alert.user_id es unico: se guarda la ultima alerta del usuario
+    alerta = db.query(Alert).filter(Alert.user_id == user_id).first()
+    for presupuesto in presupuestos_del_mes(db, user_id, fecha.year, fecha.month, category_id):
+        total = gastado(db, presupuesto, fecha.year, fecha.month)
+        if not presupuesto.amount_limit_cents:
+            continue
+        porcentaje = total * 100 / presupuesto.amount_limit_cents
+        if porcentaje < porcentaje_umbral(presupuesto):
+            if alerta is not None and alerta.budget_id == presupuesto.id:
+                db.delete(alerta) #El gasto bajo del umbral (ej. un egreso editado): la alerta ya no aplica
+                db.flush() #autoflush esta apagado: otra evaluacion en la misma sesion no debe volver a encontrarla
+                alerta = None
+            continue
+
+        if alerta is None:
+            alerta = Alert(id=uuid.uuid4(), user_id=user_id)
+            db.add(alerta)
+        alerta.budget_id = presupuesto.id
+        alerta.alert_type = "excedido" if porcentaje >= 100 else "umbral"
+        alerta.percentage_reached = round(porcentaje, 2)
+        alerta.amount_spent_cents = total
+        alerta.message = (
+            "Superaste el presupuesto de este mes." if porcentaje >= 100
+            else f"Llevas el {porcentaje:.0f}% del presupuesto de este mes."
+        )
+        alerta.created_at = datetime.datetime.now()
+        return alerta
+    return None
+
+
+def estado_usuario(user_id) -> dict:
+    # Lo que recibe un cliente al conectarse y despues de cada cambio en sus egresos
+    hoy = datetime.date.today()
+    db = session()
+    try:
+        presupuestos = []
+        for p in presupuestos_del_mes(db, user_id, hoy.year, hoy.month):
+            total = gastado(db, p, hoy.year, hoy.month)
+            categoria = db.query(Category.name).filter(Category.id == p.category_id).scalar()
+            porcentaje = round(total * 100 / p.amount_limit_cents, 2) if p.amount_limit_cents else None
+            presupuestos.append({
+                "budget_id": str(p.id),
+                "categoria": categoria,
+                "limite": a_monto(p.amount_limit_cents),
+                "gastado": a_monto(total),
+                "porcentaje": porcentaje,
+                "umbral": porcentaje_umbral(p),
+                "alerta": porcentaje is not None and porcentaje >= porcentaje_umbral(p),
+            })
+
+        alerta = db.query(Alert).filter(Alert.user_id == user_id).first()
+        return {
+            "presupuestos": presupuestos,
+            "alerta": None if alerta is None else {
+                "id": str(alerta.id),
+                "budget_id": str(alerta.budget_id),
+                "alert_type": alerta.alert_type,
+                "percentage_reached": alerta.percentage_reached,
+                "amount_spent": a_monto(alerta.amount_spent_cents),
+                "message": alerta.message,
+                "created_at": alerta.created_at.isoformat() if alerta.created_at else None,
+            },
+        }
+    finally:
+        db.close()
+
+
+class Conexion:
+    # Cola acotada por cliente: si no lee, se descartan los mensajes mas viejos
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        self.descartados = 0
+        self.ultima_alerta = None
+        self.cerrada = False
+
+    def encolar(self, mensaje):
+        if self.cerrada:
+            return
+        if self.cola.full():
+            self.cola.get_nowait()
+            self.descartados += 1
+            if self.descartados > DESCARTES_MAXIMOS:
+                mensaje = CIERRE
+        self.cerrada = mensaje is CIERRE
+        self.cola.put_nowait(mensaje)
+
+    async def siguiente(self):
+        # Mensaje siguiente, o un latido si no hubo nada en INTERVALO_LATIDO
+        try:
+            return await asyncio.wait_for(self.cola.get(), INTERVALO_LATIDO)
+        except asyncio.TimeoutError:
+            return {"tipo": "latido", "ts": datetime.datetime.now().isoformat()}
+
+
+class Hub:
+    # Conexiones abiertas de este proceso por usuario; los cambios llegan por el bus de invalidacion
+    def __init__(self):
+        self.conexiones = {} #user_id (str) -> set[Conexion]
+        self.loop = None
+        self.pendientes = set()
+        self.enviados = 0
+
+    def iniciar(self):
+        self.loop = asyncio.get_running_loop()
+        bus.suscribir(self.al_invalidar)
+
+    def cerrar_desde_hilo(self):
+        # Desde el manejador de SIGTERM: uvicorn espera a que terminen los streams antes del lifespan
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.cerrar)
+
+    def cerrar(self):
+        for conexiones in list(self.conexiones.values()):
+            for conexion in list(conexiones):
+                conexion.encolar(CIERRE)
+
+    async def conectar(self, user_id) -> Conexion:
+        conexion = Conexion(str(user_id))
+        self.conexiones.setdefault(conexion.user_id, set()).add(conexion)
+        self.entregar(conexion, await run_in_threadpool(estado_usuario, user_id))
+        return conexion
+
+    def desconectar(self, conexion: Conexion):
+        conexiones = self.conexiones.get(conexion.user_id)
+        if conexiones is not None:
+            conexiones.discard(conexion)
+            if not conexiones:
+                del self.conexiones[conexion.user_id]
+
+    def entregar(self, conexion: Conexion, estado: dict):
+        conexion.encolar({"tipo": "presupuestos", "data": estado["presupuestos"]})
+        alerta = estado["alerta"]
+        if alerta is not None and (alerta["id"], alerta["created_at"]) != conexion.ultima_alerta:
+            conexion.ultima_alerta = (alerta["id"], alerta["created_at"])
+            conexion.encolar({"tipo": "alerta", "data": alerta})
+        self.enviados += 1
+
+    def al_invalidar(self, clave: str):
+        # Puede llegar desde el hilo del bus o de una ruta: se pasa al event loop
+        if self.loop is None:
+            return
+        if clave == "*":
+            usuarios = list(self.conexiones)
+        elif clave.startswith("usuario:"):
+            usuarios = [clave.split(":")[1]]
+        else:
+            return
+        for user_id in usuarios:
+            if user_id in self.conexiones and user_id not in self.pendientes:
+                self.pendientes.add(user_id) #Varios egresos seguidos se juntan en un solo envio
+                asyncio.run_coroutine_threadsafe(self.refrescar(user_id), self.loop)
+
+    async def refrescar(self, user_id: str):
+        self.pendientes.discard(user_id)
+        if user_id not in self.conexiones:
+            return
+        estado = await run_in_threadpool(estado_usuario, uuid.UUID(user_id))
+        for conexion in list(self.conexiones.get(user_id, ())):
+            self.entregar(conexion, estado)
+
+    def metricas(self) -> dict:
+        conexiones = [c for grupo in self.conexiones.values() for c in grupo]
+        return {
+            "usuarios": len(self.conexiones),
+            "conexiones": len(conexiones),
+            "enviados": self.enviados,
+            "descartados": sum(c.descartados for c in conexiones),
+        }
+
+
+hub = Hub()
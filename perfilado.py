@@ -0,0 +1,245 @@
+import cProfile
+import datetime
+import functools
+import inspect
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+
+from database import engine, engine_replica, engine_transaccional, session, token_de
+import registro
+from routers import admin #Modulo, no la funcion: admin tambien importa este modulo
+
+CABECERA = b"x-profile"
+#Perfiles guardados en memoria de este proceso; los mas viejos se descartan
+GUARDADOS = int(os.getenv("PROFILE_KEEP", "50"))
+MAXIMO_SQL = int(os.getenv("PROFILE_MAX_SQL", "500"))
+FUNCIONES = int(os.getenv("PROFILE_TOP_FUNCTIONS", "40"))
+
+perfil_actual = ContextVar("perfil_actual", default=None)
+
+#cProfile es uno por hilo y las rutas async comparten el del event loop: un perfil a la vez
+lock_cprofile = threading.Lock()
+
+
+class Perfil:
+    def __init__(self, metodo: str, ruta: str, admin_id):
+        self.id = uuid.uuid4().hex
+        self.metodo = metodo
+        self.ruta = ruta
+        self.admin_id = admin_id
+        self.creado = datetime.datetime.now()
+        self.status = None
+        self.ms = None
+        self.profiler = None
+        self.cprofile = "sin_perfilable" #La ruta no tiene @perfilable
+        self.sql = []
+        self.sql_omitidas = 0
+        self.sql_ms = 0.0
+
+    @contextmanager
+    def medir(self):
+        if not lock_cprofile.acquire(blocking=False):
+            self.cprofile = "ocupado" #Otro perfil en curso; las consultas SQL se registran igual
+            yield
+            return
+        self.profiler = self.profiler or cProfile.Profile()
+        self.cprofile = "ok"
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+            lock_cprofile.release()
+
+    def agregar_sql(self, sentencia: str, ms: float, filas: int):
+        self.sql_ms += ms
+        if len(self.sql) >= MAXIMO_SQL:
+            self.sql_omitidas += 1
+            return
+        #Sin parametros: pueden tener contraseñas o tokens
+        self.sql.append({"sql": sentencia[:2000], "ms": round(ms, 3), "filas": filas})
+
+    def funciones(self) -> str | None:
+        if self.profiler is None:
+            return None
+        salida = io.StringIO()
+        pstats.Stats(self.profiler, stream=salida).sort_stats("cumulative").print_stats(FUNCIONES)
+        return salida.getvalue()
+
+    def pstats(self) -> bytes | None:
+        # Mismo formato que cProfile -o: se abre con pstats o snakeviz
+        if self.profiler is None:
+            return None
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+    def resumen(self) -> dict:
+        return {
+            "id": self.id,
+            "metodo": self.metodo,
+            "ruta": self.ruta,
+            "status": self.status,
+            "ms": self.ms,
+            "creado": self.creado,
+            "admin_id": self.admin_id,
+            "cprofile": self.cprofile,
+            "consultas": len(self.sql) + self.sql_omitidas,
+            "sql_ms": round(self.sql_ms, 3),
+        }
+
+    def detalle(self) -> dict:
+        return {
+            **self.resumen(),
+            "sql": sorted(self.sql, key=lambda s: s["ms"], reverse=True),
+            "sql_omitidas": self.sql_omitidas,
+            "funciones": self.funciones(),
+        }
+
+
+perfiles = OrderedDict() #id -> Perfil
+lock_perfiles = threading.Lock()
+
+
+def guardar(perfil: Perfil):
+    with lock_perfiles:
+        perfiles[perfil.id] = perfil
+        while len(perfiles) > GUARDADOS:
+            perfiles.popitem(last=False)
+
+
+def obtener(perfil_id: str) -> Perfil | None:
+    return perfiles.get(perfil_id)
+
+
+def listar() -> list:
+    with lock_perfiles:
+        return [p.resumen() for p in reversed(perfiles.values())]
+
+
+def antes_sql(conn, cursor, statement, parameters, context, executemany):
+    # El inicio va en el contexto de la ejecucion, no en la conexion: si la sentencia falla
+    # no queda nada colgado en la conexion del pool
+    if perfil_actual.get() is not None:
+        context.perfil_inicio = time.perf_counter()
+
+
+def despues_sql(conn, cursor, statement, parameters, context, executemany):
+    perfil = perfil_actual.get()
+    inicio = getattr(context, "perfil_inicio", None)
+    if perfil is None or inicio is None:
+        return
+    perfil.agregar_sql(statement, (time.perf_counter() - inicio) * 1000, cursor.rowcount)
+
+
+#Los listeners de SQL solo estan puestos mientras hay algun perfil en curso
+en_curso = 0
+lock_listeners = threading.Lock()
+
+
+def motores():
+    return {engine, engine_replica, engine_transaccional}
+
+
+def escuchar_sql():
+    global en_curso
+    with lock_listeners:
+        en_curso += 1
+        if en_curso == 1:
+            for motor in motores():
+                event.listen(motor, "before_cursor_execute", antes_sql)
+                event.listen(motor, "after_cursor_execute", despues_sql)
+
+
+def dejar_de_escuchar_sql():
+    global en_curso
+    with lock_listeners:
+        en_curso -= 1
+        if en_curso == 0:
+            for motor in motores():
+                event.remove(motor, "before_cursor_execute", antes_sql)
+                event.remove(motor, "after_cursor_execute", despues_sql)
+
+
+def perfilable(funcion):
+    # Corre la ruta bajo cProfile si la peticion pidio perfil; si no, solo lee el contextvar
+    if inspect.iscoroutinefunction(funcion):
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            perfil = perfil_actual.get()
+            if perfil is None:
+                return await funcion(*args, **kwargs)
+            #En rutas async el perfil puede incluir otras tareas que corran en los await
+            with perfil.medir():
+                return await funcion(*args, **kwargs)
+        return envoltura
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        perfil = perfil_actual.get()
+        if perfil is None:
+            return funcion(*args, **kwargs)
+        with perfil.medir():
+            return funcion(*args, **kwargs)
+    return envoltura
+
+
+def autorizar(token: str | None):
+    # id del admin, o None si no lo es (la cabecera se ignora)
+    db = session()
+    try:
+        return admin.verificar_admin(token, db).id
+    except HTTPException:
+        return None
+    finally:
+        db.close()
+
+
+class Perfilador:
+    # Middleware ASGI: con la cabecera X-Profile de un admin la peticion se perfila
+    # y la respuesta trae X-Profile-Id; el perfil se consulta en /admin/perfiles/{id}
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(nombre == CABECERA for nombre, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        admin_id = await run_in_threadpool(autorizar, token_de(Request(scope)))
+        if admin_id is None:
+            #Sin permiso la peticion sigue igual que sin cabecera
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(scope["method"], scope["path"], admin_id)
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                perfil.status = mensaje["status"]
+                mensaje["headers"] = [*mensaje.get("headers", []), (b"x-profile-id", perfil.id.encode())]
+            await send(mensaje)
+
+        escuchar_sql()
+        marca = perfil_actual.set(perfil)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil_actual.reset(marca)
+            dejar_de_escuchar_sql()
+            perfil.ms = round((time.perf_counter() - inicio) * 1000, 2)
+            perfil.ruta = getattr(scope.get("route"), "path", scope["path"])
+            guardar(perfil)
+            registro.auditar("perfil.capturado", **perfil.resumen())
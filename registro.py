@@ -0,0 +1,238 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler
+
+from sqlalchemy import insert
+
+from database import session
+from models import AppLog
+
+DESTINO = os.getenv("LOG_SINK", "archivo") #archivo | db | stdout
+RUTA_ARCHIVO = os.getenv("LOG_PATH", "logs/app.jsonl")
+TAMANO_COLA = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+TAMANO_LOTE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+INTERVALO = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+
+
+def leer_muestreo(valor: str) -> dict:
+    # "/egresos/usuario/{usuario_id}=0.1,/categorias/=0.05" -> {ruta: fraccion}
+    muestreo = {}
+    for parte in valor.split(","):
+        if "=" in parte:
+            ruta, fraccion = parte.rsplit("=", 1)
+            muestreo[ruta.strip()] = float(fraccion)
+    return muestreo
+
+#Fraccion de accesos que se registran por ruta; las respuestas con error siempre se registran
+MUESTREO = leer_muestreo(os.getenv("LOG_SAMPLING", "/egresos/usuario/{usuario_id}=0.1,/categorias/=0.1,/salud/vivo=0,/salud/listo=0"))
+
+
+class ColaAcotada(QueueHandler):
+    # Nunca bloquea la peticion: si el destino va lento y la cola se llena, el registro se descarta
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        return record #Se serializa en el hilo escritor, no en la peticion
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def a_dict(record) -> dict:
+    return {
+        "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+        "tipo": record.name,
+        "evento": record.msg,
+        **getattr(record, "datos", {}),
+    }
+
+
+class DestinoArchivo:
+    # JSON por linea, una sola escritura por lote
+    def __init__(self, ruta: str):
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.archivo = open(ruta, "a", encoding="utf-8")
+
+    def escribir(self, lote):
+        self.archivo.write("".join(json.dumps(a_dict(r), default=str) + "\n" for r in lote))
+        self.archivo.flush()
+
+    def cerrar(self):
+        self.archivo.close()
+
+
+class DestinoStdout(DestinoArchivo):
+    def __init__(self):
+        self.archivo = sys.stdout
+
+    def cerrar(self):
+        self.archivo.flush()
+
+
+class DestinoBaseDatos:
+    # Un INSERT de varias filas por lote en app_log
+    def escribir(self, lote):
+        db = session()
+        try:
+            db.execute(insert(AppLog), [
+                {
+                    "created_at": datetime.datetime.fromtimestamp(r.created),
+                    "kind": r.name,
+                    "event": r.msg,
+                    "data": json.loads(json.dumps(getattr(r, "datos", {}), default=str)),
+                }
+                for r in lote
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+    def cerrar(self):
+        pass
+
+
+def crear_destino():
+    if DESTINO == "db":
+        return DestinoBaseDatos()
+    if DESTINO == "stdout":
+        return DestinoStdout()
+    return DestinoArchivo(RUTA_ARCHIVO)
+
+
+class Escritor:
+    # Hilo que vacia la cola por lotes: hasta TAMANO_LOTE registros o INTERVALO segundos
+    def __init__(self, cola):
+        self.cola = cola
+        self.destino = None
+        self.escritos = 0
+        self.errores = 0
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self.destino = crear_destino()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._correr, name="registro", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        # Vacia lo pendiente antes de volver (se llama al apagar)
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join()
+        self._hilo = None
+        self.destino.cerrar()
+
+    def _tomar_lote(self, espera_maxima: float):
+        lote = []
+        limite = time.monotonic() + espera_maxima
+        while len(lote) < TAMANO_LOTE:
+            try:
+                lote.append(self.cola.get(timeout=max(limite - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return lote
+
+    def _correr(self):
+        while not self._detener.is_set():
+            lote = self._tomar_lote(INTERVALO)
+            if lote:
+                self._escribir(lote)
+        #Al apagar no se espera el intervalo: se vacia todo lo que quede
+        while lote := self._tomar_lote(0):
+            self._escribir(lote)
+
+    def _escribir(self, lote):
+        try:
+            self.destino.escribir(lote)
+            self.escritos += len(lote)
+        except Exception:
+            self.errores += len(lote) #El registro nunca tira abajo la app
+
+
+cola = queue.Queue(maxsize=TAMANO_COLA)
+manejador = ColaAcotada(cola)
+escritor = Escritor(cola)
+
+logger_acceso = logging.getLogger("acceso")
+logger_auditoria = logging.getLogger("auditoria")
+for _logger in (logger_acceso, logger_auditoria):
+    _logger.setLevel(logging.INFO)
+    _logger.addHandler(manejador)
+    _logger.propagate = False
+
+iniciar = escritor.iniciar
+detener = escritor.detener
+
+
+def auditar(evento: str, **datos):
+    # Acciones sensibles (login, cambios de admin, egresos): nunca se muestrean.
+    # evento es "<area>.<accion en participio>" (ej. sesion.iniciada, usuario.eliminado);
+    # quien la hizo va en los datos (user_id, admin_id)
+    logger_auditoria.info(evento, extra={"datos": datos})
+
+
+def registrar_acceso(ruta: str, status: int, **datos):
+    fraccion = MUESTREO.get(ruta, 1.0)
+    if status < 400 and fraccion < 1.0 and random.random() >= fraccion:
+        return
+    logger_acceso.info("acceso", extra={"datos": {"ruta": ruta, "status": status, "muestreo": fraccion, **datos}})
+
+
+class RegistroAccesos:
+    # Middleware ASGI: una linea por peticion con la ruta (plantilla), status y duracion
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensaje):
+            nonlocal status
+            if mensaje["type"] == "http.response.start":
+                status = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = getattr(scope.get("route"), "path", scope["path"])
+            cliente = scope.get("client")
+            registrar_acceso(
+                ruta,
+                status,
+                metodo=scope["method"],
+                ms=round((time.perf_counter() - inicio) * 1000, 2),
+                ip=cliente[0] if cliente else None,
+            )
+
+
+def metricas() -> dict:
+    return {
+        "encolados": cola.qsize(),
+        "escritos": escritor.escritos,
+        "descartados": manejador.descartados,
+        "errores": escritor.errores,
+    }
@@ -1,9 +1,33 @@
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from cache import cache_analitica
 from database import get_db
+from enviarCorreo.cola import cola_correos
+from enviarCorreo.email import enviar_correo_confirmacion, enviar_correo_contraseña
+from invalidacion import bus, clave_usuario
+import limites
+import perfilado
+import registro
+from notificaciones import hub
 from models import User, Access_log
 from uuid import UUID
-from models import Access_log, Alert, Expense, Budget
+from models import (
+    Access_log, Alert, Expense, Budget, ExpenseAnomaly, ExpenseAnomalyUser, ExpenseArchive, ExpenseRollup
+)
+from schemas import UsuarioImportado
+import csv
+import datetime
+import io
+import json
+import os
+import secrets
+import string
+import uuid
 
 
 
@@ -36,7 +60,7 @@ def crear_usuario(
     token: str = Header(...),
     db: Session = Depends(get_db)
 ):
-    verificar_admin(token, db)
+    admin = verificar_admin(token, db)
 
     nuevo = User(
         full_name=name,
@@ -47,10 +71,167 @@ def crear_usuario(
 
     db.add(nuevo)
     db.commit()
+    registro.auditar("usuario.creado", admin_id=admin.id, user_id=nuevo.id, email=email, role=role)
 
     return {"msg": "Usuario creado"}
 
 
+MAXIMO_IMPORTACION = int(os.getenv("BULK_MAX_USERS", "10000"))
+LOTE_IMPORTACION = 1000
+ROLES = {"user", "admin"}
+
+
+async def leer_filas(request: Request) -> list:
+    # JSON (lista o {"usuarios": [...]}) o CSV con encabezado full_name|name,email,password,role
+    cuerpo = await request.body()
+    if "csv" in request.headers.get("content-type", ""):
+        try:
+            texto = cuerpo.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="El CSV tiene que estar en UTF-8")
+        #Celdas vacias = campo ausente (password generada, rol por defecto)
+        return [{k: v for k, v in fila.items() if v} for fila in csv.DictReader(io.StringIO(texto))]
+    try:
+        datos = json.loads(cuerpo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo no es JSON ni CSV valido")
+    if isinstance(datos, dict):
+        datos = datos.get("usuarios")
+    if not isinstance(datos, list):
+        raise HTTPException(status_code=400, detail="Se esperaba una lista de usuarios")
+    return datos
+
+
+def existentes(db: Session, usuarios: list) -> tuple:
+    # Una sola consulta por email y nombre. La contraseña no se busca: diria por fila que
+    # alguna cuenta la usa; ese choque lo resuelve ON CONFLICT al insertar
+    emails = {u.email for u in usuarios}
+    nombres = {u.full_name for u in usuarios}
+    filas = db.query(User.email, User.full_name).filter(or_(
+        User.email.in_(emails),
+        User.full_name.in_(nombres)
+    )).all()
+    return (
+        {f.email for f in filas},
+        {f.full_name for f in filas}
+    )
+
+
+def insertar_usuarios(db: Session, filas: list) -> set:
+    # INSERT de varias filas que saltea las que chocan con un indice unico; devuelve los ids creados
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    sentencia = dialecto.insert(User).on_conflict_do_nothing().returning(User.id)
+    return set(db.execute(sentencia, filas).scalars().all())
+
+
+@router.post("/users/bulk")
+async def importar_usuarios(
+    request: Request,
+    enviar_correo: bool = False,
+    token: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    #Solo la lectura del cuerpo es async; las consultas y el INSERT van al threadpool
+    admin = await run_in_threadpool(verificar_admin, token, db)
+    filas = await leer_filas(request)
+    if len(filas) > MAXIMO_IMPORTACION:
+        raise HTTPException(status_code=400, detail=f"Maximo {MAXIMO_IMPORTACION} usuarios por importacion")
+    return await run_in_threadpool(procesar_importacion, db, admin, filas, enviar_correo)
+
+
+def procesar_importacion(db: Session, admin: User, filas: list, enviar_correo: bool) -> dict:
+    resultados = []
+    validos = [] #(indice en resultados, usuario)
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            usuario = UsuarioImportado.model_validate(fila)
+        except ValidationError as error:
+            resultados.append({"fila": numero, "estado": "error", "detalle": "; ".join(f"{e['loc'][0] if e['loc'] else 'fila'}: {e['msg']}" for e in error.errors())})
+            continue
+        usuario.email = usuario.email.strip()
+        usuario.full_name = usuario.full_name.strip()
+        generada = not usuario.password
+        if generada:
+            usuario.password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(10))
+
+        detalle = None
+        if "@" not in usuario.email:
+            detalle = "Email invalido"
+        elif usuario.role not in ROLES:
+            detalle = f"Rol invalido, use: {', '.join(sorted(ROLES))}"
+        resultados.append({"fila": numero, "email": usuario.email, "estado": "error" if detalle else "valido", "detalle": detalle})
+        if not detalle:
+            validos.append((len(resultados) - 1, usuario, generada))
+
+    emails, nombres = existentes(db, [u for _, u, _ in validos])
+    passwords = set() #Solo las de esta importacion
+    nuevos = []
+    for indice, usuario, generada in validos:
+        if usuario.email in emails:
+            detalle = "Email ya registrado"
+        elif usuario.full_name in nombres:
+            detalle = "Nombre ya registrado"
+        elif usuario.password in passwords:
+            detalle = "Contraseña repetida en la importacion"
+        else:
+            detalle = None
+        if detalle:
+            resultados[indice].update(estado="error", detalle=detalle)
+            continue
+        #Repetidos dentro de la misma importacion: gana la primera fila
+        emails.add(usuario.email)
+        nombres.add(usuario.full_name)
+        passwords.add(usuario.password)
+        nuevos.append((indice, usuario, generada))
+
+    ahora = datetime.datetime.now()
+    filas_usuario = [
+        {
+            "id": uuid.uuid4(),
+            "full_name": usuario.full_name,
+            "email": usuario.email,
+            "password_hash": usuario.password,
+            "role": usuario.role,
+            "is_active": True,
+            "email_verified": False,
+            "created_at": ahora,
+            "updated_at": ahora,
+        }
+        for _, usuario, _ in nuevos
+    ]
+    creados = set()
+    try:
+        #Lotes de INSERT de varias filas, un solo commit
+        for inicio in range(0, len(filas_usuario), LOTE_IMPORTACION):
+            creados |= insertar_usuarios(db, filas_usuario[inicio:inicio + LOTE_IMPORTACION])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="No se pudo completar la importacion, reintente")
+
+    for (indice, usuario, generada), fila in zip(nuevos, filas_usuario):
+        if fila["id"] not in creados:
+            #Choque con una cuenta existente (otro proceso o la contraseña): mensaje generico a proposito
+            resultados[indice].update(estado="error", detalle="No se pudo crear el usuario")
+            continue
+        resultados[indice].update(estado="creado", id=fila["id"])
+        if enviar_correo:
+            if generada:
+                encolado = cola_correos.encolar(enviar_correo_contraseña, usuario.email, usuario.password)
+            else:
+                encolado = cola_correos.encolar(enviar_correo_confirmacion, usuario.email)
+            resultados[indice]["correo"] = "encolado" if encolado else "no_encolado"
+
+    registro.auditar("usuario.importado", admin_id=admin.id, creados=len(creados), errores=len(resultados) - len(creados))
+
+    return {
+        "msg": "Importacion terminada",
+        "creados": len(creados),
+        "errores": len(resultados) - len(creados),
+        "data": resultados
+    }
+
+
 @router.put("/users/{user_id}")
 def editar_usuario(
     user_id: UUID,
@@ -60,18 +241,21 @@ def editar_usuario(
     token: str = Header(...),
     db: Session = Depends(get_db)
 ):
-    verificar_admin(token, db)
+    admin = verificar_admin(token, db)
 
     user = db.query(User).filter(User.id == user_id).first()
 
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
+    anterior = {"email": user.email, "role": user.role}
     user.full_name = name
     user.email = email
     user.role = role
 
     db.commit()
+    bus.publicar(clave_usuario(user_id))
+    registro.auditar("usuario.editado", admin_id=admin.id, user_id=user_id, antes=anterior, despues={"email": email, "role": role})
 
     return {"msg": "Usuario actualizado"}
 
@@ -82,7 +266,7 @@ def eliminar_usuario(
     token: str = Header(...),
     db: Session = Depends(get_db)
 ):
-    verificar_admin(token, db)
+    admin = verificar_admin(token, db)
 
     user = db.query(User).filter(User.id == user_id).first()
 
@@ -94,9 +278,81 @@ def eliminar_usuario(
     db.query(Alert).filter(Alert.user_id == user.id).delete()
     db.query(Expense).filter(Expense.user_id == user.id).delete()
     db.query(Budget).filter(Budget.user_id == user.id).delete()
+    #Gastos archivados, sus totales y los atipicos calculados tambien son datos del usuario
+    db.query(ExpenseArchive).filter(ExpenseArchive.user_id == user.id).delete()
+    db.query(ExpenseRollup).filter(ExpenseRollup.user_id == user.id).delete()
+    db.query(ExpenseAnomaly).filter(ExpenseAnomaly.user_id == user.id).delete()
+    db.query(ExpenseAnomalyUser).filter(ExpenseAnomalyUser.user_id == user.id).delete()
 
     # 🔥 Ahora sí borrar usuario
     db.delete(user)
     db.commit()
+    bus.publicar(clave_usuario(user_id))
+    registro.auditar("usuario.eliminado", admin_id=admin.id, user_id=user_id)
+
+    return {"msg": "Usuario eliminado correctamente"}
+
 
-    return {"msg": "Usuario eliminado correctamente"}
\ No newline at end of file
+@router.get("/metricas")
+def metricas(
+    token: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    verificar_admin(token, db)
+
+    return {
+        "limites": limites.metricas(),
+        "registro": registro.metricas(),
+        "alertas": hub.metricas(),
+        "correos": cola_correos.metricas(),
+        "cache_analitica": cache_analitica.metricas()
+    }
+
+
+@router.get("/perfiles")
+def listar_perfiles(
+    token: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    verificar_admin(token, db)
+
+    return {
+        "msg": "Perfiles guardados en este proceso",
+        "data": perfilado.listar()
+    }
+
+
+@router.get("/perfiles/{perfil_id}")
+def obtener_perfil(
+    perfil_id: str,
+    token: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    verificar_admin(token, db)
+    perfil = perfilado.obtener(perfil_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado (puede haberlo atendido otro proceso)")
+
+    return {
+        "msg": "Perfil de la peticion",
+        "data": perfil.detalle()
+    }
+
+
+@router.get("/perfiles/{perfil_id}/pstats")
+def descargar_perfil(
+    perfil_id: str,
+    token: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    verificar_admin(token, db)
+    perfil = perfilado.obtener(perfil_id)
+    datos = perfil.pstats() if perfil else None
+    if datos is None:
+        raise HTTPException(status_code=404, detail="Perfil sin datos de cProfile")
+
+    return Response(
+        content=datos,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{perfil_id}.prof"'}
+    )
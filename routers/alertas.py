@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import json
+
+from database import session
+from models import Access_log
+from notificaciones import CIERRE, hub
+
+router = APIRouter(prefix="/alertas", tags=["Alertas"])
+
+def usuario_del_token(token: str | None):
+    # Los navegadores no permiten cabeceras en WebSocket ni EventSource: se acepta ?token=
+    if not token:
+        return None
+    db = session()
+    try:
+        acceso = db.query(Access_log).filter(Access_log.id == token).first()
+        return acceso.user_id if acceso else None
+    finally:
+        db.close()
+
+@router.websocket("/ws")
+async def alertas_ws(websocket: WebSocket):
+    token = websocket.headers.get("x-token") or websocket.query_params.get("token")
+    user_id = await run_in_threadpool(usuario_del_token, token)
+    if user_id is None:
+        await websocket.close(code=1008) #Politica: token invalido
+        return
+
+    await websocket.accept()
+    conexion = await hub.conectar(user_id)
+    try:
+        while True:
+            mensaje = await conexion.siguiente()
+            if mensaje is CIERRE:
+                await websocket.close(code=1001) #El servidor se apaga o el cliente no lee
+                return
+            await websocket.send_json(mensaje)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.desconectar(conexion)
+
+@router.get("/sse")
+async def alertas_sse(request: Request, token: str | None = None):
+    user_id = await run_in_threadpool(usuario_del_token, request.headers.get("x-token") or token)
+    if user_id is None:
+        raise HTTPException(status_code=403, detail={"msg": "Token invalido"})
+
+    conexion = await hub.conectar(user_id)
+
+    async def eventos():
+        try:
+            while not await request.is_disconnected():
+                mensaje = await conexion.siguiente()
+                if mensaje is CIERRE:
+                    return
+                if mensaje["tipo"] == "latido":
+                    yield ": latido\n\n" #Comentario SSE: mantiene viva la conexion y los proxies
+                else:
+                    yield f"event: {mensaje['tipo']}\ndata: {json.dumps(mensaje['data'], default=str)}\n\n"
+        finally:
+            hub.desconectar(conexion)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from uuid import uuid4
 import datetime
 
 from database import get_db
+from idempotencia import Idempotencia, idempotencia
+from invalidacion import bus, clave_usuario
 from models import Budget, Access_log, Category
-from schemas import BudgetCreate
+from schemas import BudgetCreate, BudgetSalida
 
 router = APIRouter(prefix="/budgets", tags=["Budgets"])
 
@@ -13,7 +16,8 @@ router = APIRouter(prefix="/budgets", tags=["Budgets"])
 def create_budget(
     budget: BudgetCreate,
     token: str = Header(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: Idempotencia = Depends(idempotencia)
 ):
 
     # 🔐 Validar token
@@ -26,6 +30,9 @@ def create_budget(
 
     user_id = access.user_id
 
+    if idem.repetida:
+        return idem.repetida
+
     # 🔎 Buscar categoría por nombre
     category = db.query(Category).filter(
         Category.name == budget.category_name
@@ -54,7 +61,7 @@ def create_budget(
     # 💾 Crear presupuesto
     new_budget = Budget(
         id=uuid4(),
-        amount_limit=budget.amount_limit,
+        amount_limit_cents=budget.amount_limit_cents,
         month=budget.month,
         year=budget.year,
         alert_treshold=budget.alert_treshold,
@@ -64,10 +71,14 @@ def create_budget(
     )
 
     db.add(new_budget)
-    db.commit()
+    db.flush()
     db.refresh(new_budget)
 
-    return {
+    respuesta = idem.guardar({
         "msg": "Presupuesto creado correctamente",
-        "data": new_budget
-    }
\ No newline at end of file
+        "data": jsonable_encoder(BudgetSalida.model_validate(new_budget))
+    })
+    db.commit()
+    bus.publicar(clave_usuario(user_id))
+
+    return respuesta
\ No newline at end of file
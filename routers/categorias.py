@@ -3,16 +3,39 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import uuid
 from pydantic import BaseModel
+import os
 
-from database import get_db
+from cache import cache
+from database import get_db_lectura
 from models import Category
 from security import verify_token
 
 router = APIRouter(prefix="/categorias", tags=["Categorías"])
 
+CLAVE_CACHE = "categorias"
+#Las categorias se cargan tambien por fuera de la app (semillas, SQL): se releen cada tanto
+TTL_CATEGORIAS = float(os.getenv("CATEGORIES_CACHE_TTL", "300"))
+
+def cargar_categorias(db: Session):
+    # Las categorias casi no cambian, se guardan ya serializadas
+    categorias = [
+        {
+            "id": c.id,
+            "name": c.name,
+            "description": c.description,
+            "created_at": c.created_at
+        }
+        for c in db.query(Category).all()
+    ]
+    if categorias:
+        cache.guardar(CLAVE_CACHE, categorias, ttl=TTL_CATEGORIAS) #Vacia no se guarda: se reintenta en la proxima
+    return categorias
+
 @router.get("/", dependencies=[Depends(verify_token)])
-async def listar_categorias(db: Session = Depends(get_db)):
-    categorias = db.query(Category).all()
+async def listar_categorias(db: Session = Depends(get_db_lectura)):
+    categorias = cache.obtener(CLAVE_CACHE)
+    if categorias is None:
+        categorias = cargar_categorias(db)
 
     if not categorias:
         raise HTTPException(status_code=404, detail="No se encontraron categorías")
@@ -20,4 +43,4 @@ async def listar_categorias(db: Session = Depends(get_db)):
     return {
         "msg": "Listado de categorías",
         "data": categorias
-    }
\ No newline at end of file
+    }
@@ -1,20 +1,39 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from sqlalchemy import func, extract, literal, literal_column
+from datetime import date, datetime, time, timedelta
 from uuid import UUID
-
-from database import get_db
-from models import Category, Expense
-from schemas import EgresoType, EgresoUpdate
+import json
+import re
+
+from cache import cache, cache_analitica
+from database import VENTANA_ADHERENCIA, es_replica, get_db, get_db_lectura
+from idempotencia import Idempotencia, idempotencia
+from invalidacion import bus, clave_usuario
+from notificaciones import evaluar_presupuesto
+from perfilado import perfilable
+from registro import auditar
+from models import (
+    Category, Expense, ExpenseAnomaly, ExpenseAnomalyUser, ExpenseArchive, ExpenseArchiveRun, ExpenseRollup,
+    expense_fts, vector_descripcion
+)
+from schemas import EgresoType, EgresoUpdate, EgresoSalida, a_monto
 from security import verify_token
 
 router = APIRouter(prefix="/egresos", tags=["Egresos"])
 
 @router.post("/crear", dependencies=[Depends(verify_token)])
-async def crear_egreso(egreso: EgresoType, db: Session = Depends(get_db)):
+async def crear_egreso(
+    egreso: EgresoType,
+    db: Session = Depends(get_db),
+    idem: Idempotencia = Depends(idempotencia)
+):
+    if idem.repetida:
+        return idem.repetida
+
     nuevo_egreso = Expense(
-        amount = egreso.amount,
+        amount_cents = egreso.amount_cents,
         expense_date = egreso.expense_date,
         description = egreso.description,
         is_recurring = egreso.is_recurring,
@@ -25,30 +44,83 @@ async def crear_egreso(egreso: EgresoType, db: Session = Depends(get_db)):
     )
 
     db.add(nuevo_egreso)
-    db.commit()
+    db.flush()
     db.refresh(nuevo_egreso)
+    evaluar_presupuesto(db, nuevo_egreso.user_id, nuevo_egreso.category_id, nuevo_egreso.expense_date)
+    descartar_atipicos(db, nuevo_egreso.user_id)
 
-    return {
+    respuesta = idem.guardar({
         "msg": "Egreso creado correctamente",
-        "data": nuevo_egreso
-    }
+        "data": jsonable_encoder(EgresoSalida.model_validate(nuevo_egreso))
+    })
+    db.commit()
+    bus.publicar(clave_usuario(nuevo_egreso.user_id))
+    auditar("egreso.creado", user_id=nuevo_egreso.user_id, expense_id=nuevo_egreso.id, amount_cents=nuevo_egreso.amount_cents)
+
+    return respuesta
+
+CLAVE_ARCHIVO = "archivo"
+
+@bus.suscribir
+def al_archivar(clave: str):
+    # Los atipicos solo miran gastos sin archivar: al mover gastos cambian para todos
+    if clave == CLAVE_ARCHIVO:
+        cache_analitica.invalidar("*")
+
+def horizonte_archivo(db: Session):
+    # Hasta donde puede haber gastos en expense_archive; tareas/archivo.py lo invalida por el bus
+    guardado = cache.obtener(CLAVE_ARCHIVO)
+    if guardado is None:
+        guardado = {"horizonte": db.query(func.max(ExpenseArchiveRun.horizon)).scalar()}
+        cache.guardar(CLAVE_ARCHIVO, guardado)
+    return guardado["horizonte"]
+
+def usa_archivo(db: Session, desde: datetime | None) -> bool:
+    # Solo se une el archivo si el rango pedido empieza antes del horizonte
+    horizonte = horizonte_archivo(db)
+    return horizonte is not None and (desde is None or desde < horizonte)
+
+def filtros_rango(modelo, usuario_id, desde: date | None, hasta: date | None):
+    # Sirve igual para Expense y ExpenseArchive (mismas columnas)
+    filtros = [modelo.user_id == usuario_id]
+    if desde:
+        filtros.append(modelo.expense_date >= datetime.combine(desde, time.min))
+    if hasta:
+        filtros.append(modelo.expense_date < datetime.combine(hasta + timedelta(days=1), time.min))
+    return filtros
 
 @router.get("/usuario/{usuario_id}", dependencies=[Depends(verify_token)])
-async def listar_egresos(usuario_id: UUID, db: Session = Depends(get_db)):
-
-    resultados_db = db.query(Expense, Category).join(Category, Expense.category_id == Category.id
-                    ).filter(Expense.user_id == usuario_id
-                    ).order_by(Expense.expense_date.desc()).all()
+@perfilable
+async def listar_egresos(
+    usuario_id: UUID,
+    desde: date | None = None,
+    hasta: date | None = None,
+    db: Session = Depends(get_db_lectura)
+):
+    def listado(modelo):
+        return db.query(
+            modelo.id,
+            modelo.description,
+            modelo.amount_cents,
+            modelo.expense_date.label("expense_date"),
+            Category.name.label("category")
+        ).join(Category, modelo.category_id == Category.id
+        ).filter(*filtros_rango(modelo, usuario_id, desde, hasta))
+
+    consulta = listado(Expense)
+    if usa_archivo(db, datetime.combine(desde, time.min) if desde else None):
+        consulta = consulta.union_all(listado(ExpenseArchive))
+    resultados_db = consulta.order_by(literal_column("expense_date").desc()).all()
 
     lista = []
 
-    for expense, category in resultados_db:
+    for expense in resultados_db:
         lista.append({
             "id": expense.id,
             "description": expense.description,
-            "amount": expense.amount,
+            "amount": a_monto(expense.amount_cents),
             "expense_date": expense.expense_date,
-            "category": category.name  
+            "category": expense.category
         })
 
     return {
@@ -56,19 +128,45 @@ async def listar_egresos(usuario_id: UUID, db: Session = Depends(get_db)):
         "data": lista
     }
 
+def respuesta_analitica(db: Session, usuario_id, nombre: str, calcular):
+    # Respuesta ya serializada mientras el usuario no escriba (cache_analitica, por version de datos)
+    cuerpo = cache_analitica.obtener(usuario_id, nombre)
+    if cuerpo is not None:
+        return Response(content=cuerpo, media_type="application/json")
+
+    version = cache_analitica.version(usuario_id)
+    cuerpo = json.dumps(jsonable_encoder(calcular()), separators=(",", ":")).encode()
+    #La replica puede no tener aun la escritura que subio la version: dentro de la ventana
+    #de adherencia su resultado se sirve pero no se cachea, o quedaria hasta la proxima escritura
+    if not (es_replica(db) and cache_analitica.segundos_desde_cambio(usuario_id) < VENTANA_ADHERENCIA):
+        cache_analitica.guardar(usuario_id, nombre, version, cuerpo)
+    return Response(content=cuerpo, media_type="application/json")
+
 @router.get("/grafico/categoria/{usuario_id}", dependencies=[Depends(verify_token)])
-async def grafico_por_categoria(usuario_id: UUID, db: Session = Depends(get_db)):
+@perfilable
+async def grafico_por_categoria(usuario_id: UUID, db: Session = Depends(get_db_lectura)):
+    return respuesta_analitica(db, usuario_id, "grafico_categoria", lambda: totales_por_categoria(db, usuario_id))
 
-    resultados_db = db.query(Category.name,func.sum(Expense.amount).label("total")
+def totales_por_categoria(db: Session, usuario_id):
+    resultados_db = db.query(Category.name,func.sum(Expense.amount_cents).label("total")
                     ).join(Category, Expense.category_id == Category.id
                     ).filter(Expense.user_id == usuario_id
                     ).group_by(Category.name).all()
 
+    totales = {r.name: int(r.total) for r in resultados_db}
+    if usa_archivo(db, None):
+        #Lo archivado ya esta sumado por mes en expense_rollup
+        for r in db.query(Category.name, func.sum(ExpenseRollup.total_cents).label("total")
+                    ).join(Category, ExpenseRollup.category_id == Category.id
+                    ).filter(ExpenseRollup.user_id == usuario_id
+                    ).group_by(Category.name).all():
+            totales[r.name] = totales.get(r.name, 0) + int(r.total)
+
     data = []
-    for r in resultados_db:
+    for nombre, total in totales.items():
         data.append({
-            "category_name": r.name,
-            "total": float(r.total)
+            "category_name": nombre,
+            "total": a_monto(total)
         })
         
     return {
@@ -77,18 +175,28 @@ async def grafico_por_categoria(usuario_id: UUID, db: Session = Depends(get_db))
     }
 
 @router.get("/grafico/mensual/{usuario_id}", dependencies=[Depends(verify_token)])
-async def grafico_mensual(usuario_id: UUID, db: Session = Depends(get_db)):
+@perfilable
+async def grafico_mensual(usuario_id: UUID, db: Session = Depends(get_db_lectura)):
+    return respuesta_analitica(db, usuario_id, "grafico_mensual", lambda: totales_por_mes(db, usuario_id))
 
-    resultados_db = db.query(extract("month", Expense.expense_date).label("mes"), func.sum(Expense.amount).label("total")
+def totales_por_mes(db: Session, usuario_id):
+    resultados_db = db.query(extract("month", Expense.expense_date).label("mes"), func.sum(Expense.amount_cents).label("total")
                     ).filter(Expense.user_id == usuario_id
                     ).group_by("mes"
                     ).order_by("mes").all()
 
+    totales = {int(r.mes): int(r.total) for r in resultados_db}
+    if usa_archivo(db, None):
+        for r in db.query(extract("month", ExpenseRollup.month).label("mes"), func.sum(ExpenseRollup.total_cents).label("total")
+                    ).filter(ExpenseRollup.user_id == usuario_id
+                    ).group_by("mes").all():
+            totales[int(r.mes)] = totales.get(int(r.mes), 0) + int(r.total)
+
     data = []
-    for r in resultados_db:
+    for mes, total in sorted(totales.items()):
         data.append({
-            "mes": int(r.mes),
-            "total": float(r.total)
+            "mes": mes,
+            "total": a_monto(total)
         })
 
     return {
@@ -96,88 +204,427 @@ async def grafico_mensual(usuario_id: UUID, db: Session = Depends(get_db)):
         "data": data
     }
 
-@router.get("/{user_id}/atipicos", dependencies=[Depends(verify_token)])
-def obtener_gastos_atipicos(user_id: str, db: Session = Depends(get_db)):
-    gastos = db.query(Expense).options(
-            joinedload(Expense.categories)).filter(
-            Expense.user_id == user_id).all()
-
+#Reglas de atipicos, compartidas con la tarea por lotes (tareas/atipicos.py)
+MINIMO_GASTOS = 6
+MAXIMO_POCO_FRECUENTE = 3
+ULTIMO_CAMBIO = func.coalesce(Expense.updated_at, Expense.created_at)
+
+def mensaje_atipico(es_monto_inusual: bool, es_categoria_poco_frecuente: bool) -> str:
+    if es_monto_inusual and es_categoria_poco_frecuente:
+        return "Este gasto es mayor al promedio habitual y pertenece a una categoría que usas con poca frecuencia."
+    elif es_monto_inusual:
+        return "Este gasto supera significativamente tu promedio habitual."
+    elif es_categoria_poco_frecuente:
+        return "Esta categoría no es común dentro de tus gastos habituales."
+    return ""
+
+def calcular_atipicos(gastos):
+    # gastos: filas con id, expense_date, description, amount_cents, category_id y categoria
     total_gastos = len(gastos)
     
     #Que haya un minimo de gastos por analizar
-    if total_gastos < 6:
-        return {
-            "data": []
-        }
+    if total_gastos < MINIMO_GASTOS:
+        return []
 
     suma_total = 0
+    contador_categoria = {}
     for g in gastos:
-        suma_total += g.amount
-
-    promedio_general = suma_total/total_gastos
+        suma_total += g.amount_cents
+        contador_categoria[g.category_id] = contador_categoria.get(g.category_id, 0) + 1
 
     resultado = []
 
     for gasto in gastos:
         flags = []
-        mensaje = ""
         es_monto_inusual = False
-        if gasto.amount > promedio_general * 1.5:
+        #monto > promedio * 1.5, en enteros para que la comparacion sea exacta
+        if gasto.amount_cents * total_gastos * 2 > suma_total * 3:
             es_monto_inusual = True
             flags.append("MONTO_INUSUAL")
 
-        contador_categoria = 0
-        for g in gastos:
-            if g.category_id == gasto.category_id:
-                contador_categoria += 1
-
         es_categoria_poco_frecuente = False
-        if contador_categoria <= 3:
+        if contador_categoria[gasto.category_id] <= MAXIMO_POCO_FRECUENTE:
             es_categoria_poco_frecuente = True
             flags.append("CATEGORIA_POCO_FRECUENTE")
 
-        if es_monto_inusual and es_categoria_poco_frecuente:
-            mensaje = "Este gasto es mayor al promedio habitual y pertenece a una categoría que usas con poca frecuencia."
-        elif es_monto_inusual:
-            mensaje = "Este gasto supera significativamente tu promedio habitual."
-        elif es_categoria_poco_frecuente:
-            mensaje = "Esta categoría no es común dentro de tus gastos habituales."
-
         if len(flags) > 0:
             resultado.append({
                 "id": gasto.id,
                 "fecha": gasto.expense_date,
                 "descripcion": gasto.description,
-                "categoria": gasto.categories.name,
-                "monto": gasto.amount,
+                "categoria": gasto.categoria,
+                "monto": a_monto(gasto.amount_cents),
                 "flags": flags,
-                "mensaje" : mensaje
+                "mensaje" : mensaje_atipico(es_monto_inusual, es_categoria_poco_frecuente)
             })
 
+    return resultado
+
+def consultar_gastos(db: Session, usuario_id, archivo: bool = True):
+    # Una sola lectura con lo necesario para listado, graficos y atipicos
+    def gastos(modelo, archivado: bool):
+        return db.query(
+            modelo.id,
+            modelo.expense_date.label("expense_date"),
+            modelo.description,
+            modelo.amount_cents,
+            modelo.category_id,
+            Category.name.label("categoria"),
+            literal(archivado).label("archivado")
+        ).outerjoin(Category, modelo.category_id == Category.id
+        ).filter(modelo.user_id == usuario_id)
+
+    consulta = gastos(Expense, False)
+    if archivo and usa_archivo(db, None):
+        consulta = consulta.union_all(gastos(ExpenseArchive, True))
+    return consulta.order_by(literal_column("expense_date").desc())
+
+def descartar_atipicos(db: Session, usuario_id):
+    # Al escribir un egreso la corrida por lotes deja de valer para ese usuario (hasta la proxima)
+    db.query(ExpenseAnomalyUser).filter(ExpenseAnomalyUser.user_id == usuario_id).delete(synchronize_session=False)
+
+def atipicos_precalculados(db: Session, usuario_id):
+    # Resultado de tareas/atipicos.py, solo si los gastos no cambiaron desde esa corrida
+    resumen = db.query(ExpenseAnomalyUser).filter(ExpenseAnomalyUser.user_id == usuario_id).first()
+    if resumen is None:
+        return None
+
+    cantidad, ultimo_cambio = db.query(func.count(Expense.id), func.max(ULTIMO_CAMBIO)).filter(
+        Expense.user_id == usuario_id
+    ).one()
+    if cantidad != resumen.expense_count or ultimo_cambio != resumen.last_change_at:
+        return None
+
+    filas = db.query(
+        Expense.id,
+        Expense.expense_date,
+        Expense.description,
+        Expense.amount_cents,
+        Category.name.label("categoria"),
+        ExpenseAnomaly.flags,
+        ExpenseAnomaly.message
+    ).join(
+        ExpenseAnomaly, ExpenseAnomaly.expense_id == Expense.id
+    ).outerjoin(
+        Category, Expense.category_id == Category.id
+    ).filter(
+        ExpenseAnomaly.user_id == usuario_id
+    ).order_by(Expense.expense_date.desc()).all()
+
+    return [
+        {
+            "id": f.id,
+            "fecha": f.expense_date,
+            "descripcion": f.description,
+            "categoria": f.categoria,
+            "monto": a_monto(f.amount_cents),
+            "flags": f.flags.split(","),
+            "mensaje": f.message
+        }
+        for f in filas
+    ]
+
+@router.get("/{user_id}/atipicos", dependencies=[Depends(verify_token)])
+@perfilable
+def obtener_gastos_atipicos(user_id: UUID, db: Session = Depends(get_db_lectura)):
+    return respuesta_analitica(db, user_id, "atipicos", lambda: gastos_atipicos(db, user_id))
+
+def gastos_atipicos(db: Session, user_id):
+    atipicos = atipicos_precalculados(db, user_id)
+    if atipicos is None:
+        #Los atipicos se comparan contra el historial no archivado, igual que tareas/atipicos.py
+        atipicos = calcular_atipicos(consultar_gastos(db, user_id, archivo=False).all())
+
     return {
-      "data": resultado
+      "data": atipicos
+    }
+
+SECCIONES_DASHBOARD = {"recientes", "categorias", "mensual", "atipicos"}
+
+@router.get("/dashboard/{usuario_id}", dependencies=[Depends(verify_token)])
+@perfilable
+def dashboard(
+    usuario_id: UUID,
+    secciones: str = "recientes,categorias,mensual,atipicos",
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_lectura)
+):
+    pedidas = {s.strip() for s in secciones.split(",") if s.strip()}
+    invalidas = pedidas - SECCIONES_DASHBOARD
+    if invalidas:
+        raise HTTPException(status_code=400, detail=f"Secciones invalidas: {', '.join(sorted(invalidas))}")
+
+    consulta = consultar_gastos(db, usuario_id)
+    if pedidas == {"recientes"}:
+        consulta = consulta.limit(limite) #No hace falta el historial completo
+    gastos = consulta.all()
+
+    data = {}
+
+    if "recientes" in pedidas:
+        data["recientes"] = [
+            {
+                "id": g.id,
+                "description": g.description,
+                "amount": a_monto(g.amount_cents),
+                "expense_date": g.expense_date,
+                "category": g.categoria
+            }
+            for g in gastos[:limite]
+        ]
+
+    if "categorias" in pedidas or "mensual" in pedidas:
+        por_categoria = {}
+        por_mes = {}
+        for g in gastos:
+            if g.categoria is not None:
+                por_categoria[g.categoria] = por_categoria.get(g.categoria, 0) + g.amount_cents
+            if g.expense_date is not None:
+                por_mes[g.expense_date.month] = por_mes.get(g.expense_date.month, 0) + g.amount_cents
+
+        if "categorias" in pedidas:
+            data["categorias"] = [
+                {"category_name": nombre, "total": a_monto(total)}
+                for nombre, total in por_categoria.items()
+            ]
+        if "mensual" in pedidas:
+            data["mensual"] = [
+                {"mes": mes, "total": a_monto(total)}
+                for mes, total in sorted(por_mes.items())
+            ]
+
+    if "atipicos" in pedidas:
+        data["atipicos"] = calcular_atipicos([g for g in gastos if not g.archivado])
+
+    return {
+        "msg": "Dashboard",
+        "data": data
     }
 
 
+def mes_y_categoria(category_id, fecha):
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    return (category_id, fecha.year, fecha.month) if fecha else (category_id, None, None)
+
 @router.put("/editar/{egreso_id}", dependencies=[Depends(verify_token)])
 async def editar_egreso(egreso_id: UUID, egreso: EgresoUpdate, db: Session = Depends(get_db)):
     egreso_db = db.query(Expense).filter(Expense.id == egreso_id).first()
 
     if not egreso_db:
+        #Lo archivado ya esta sumado en expense_rollup: es de solo lectura
+        if db.query(ExpenseArchive.id).filter(ExpenseArchive.id == egreso_id).first():
+            raise HTTPException(status_code=409, detail="El egreso esta archivado y no se puede editar")
         return {"msg": "Egreso no encontrado"}
 
-    egreso_db.amount = egreso.amount
+    anterior = (egreso_db.category_id, egreso_db.expense_date)
+    egreso_db.amount_cents = egreso.amount_cents
 
     egreso_db.expense_date = egreso.expense_date
     egreso_db.description = egreso.description
     egreso_db.is_recurring = egreso.is_recurring
     egreso_db.category_id = egreso.category_id
     egreso_db.updated_at = datetime.utcnow()
+    db.flush()
+    #Si cambio de categoria o de mes, el presupuesto anterior tambien cambia de estado
+    if mes_y_categoria(*anterior) != mes_y_categoria(egreso_db.category_id, egreso_db.expense_date):
+        evaluar_presupuesto(db, egreso_db.user_id, *anterior)
+    evaluar_presupuesto(db, egreso_db.user_id, egreso_db.category_id, egreso_db.expense_date)
+    descartar_atipicos(db, egreso_db.user_id)
 
     db.commit()
     db.refresh(egreso_db)
+    bus.publicar(clave_usuario(egreso_db.user_id))
+    auditar("egreso.editado", user_id=egreso_db.user_id, expense_id=egreso_db.id, amount_cents=egreso_db.amount_cents)
 
     return {
         "msg": "Egreso editado correctamente",
-        "data": egreso_db
-    }
\ No newline at end of file
+        "data": EgresoSalida.model_validate(egreso_db)
+    }
+
+GRANULARIDADES = {"day", "week", "month", "quarter", "year"}
+#Dias minimos por periodo, para acotar cuantos periodos (en cero incluidos) puede pedir una serie
+DIAS_PERIODO = {"day": 1, "week": 7, "month": 28, "quarter": 90, "year": 365}
+MAXIMO_PERIODOS = 1000
+
+def truncar_fecha(fecha, granularidad: str) -> date:
+    # Mismo resultado que date_trunc de PostgreSQL (semanas desde el lunes)
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    if granularidad == "day":
+        return fecha
+    if granularidad == "week":
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == "month":
+        return fecha.replace(day=1)
+    if granularidad == "quarter":
+        return date(fecha.year, 3 * ((fecha.month - 1) // 3) + 1, 1)
+    return date(fecha.year, 1, 1)
+
+def siguiente_periodo(fecha: date, granularidad: str) -> date:
+    if granularidad == "day":
+        return fecha + timedelta(days=1)
+    if granularidad == "week":
+        return fecha + timedelta(days=7)
+    if granularidad == "year":
+        return date(fecha.year + 1, 1, 1)
+    meses = 1 if granularidad == "month" else 3
+    mes = fecha.month - 1 + meses
+    return date(fecha.year + mes // 12, mes % 12 + 1, 1)
+
+@router.get("/serie/{usuario_id}", dependencies=[Depends(verify_token)])
+@perfilable
+def serie_egresos(
+    usuario_id: UUID,
+    granularidad: str = "month",
+    desde: date | None = None,
+    hasta: date | None = None,
+    por_categoria: bool = False,
+    db: Session = Depends(get_db_lectura)
+):
+    if granularidad not in GRANULARIDADES:
+        raise HTTPException(status_code=400, detail=f"Granularidad invalida, use: {', '.join(sorted(GRANULARIDADES))}")
+
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=365)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="El rango de fechas es invalido")
+    if (hasta - desde).days // DIAS_PERIODO[granularidad] + 1 > MAXIMO_PERIODOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Rango demasiado amplio: maximo {MAXIMO_PERIODOS} periodos, use una granularidad mayor"
+        )
+
+    modelos = [Expense]
+    if usa_archivo(db, datetime.combine(desde, time.min)):
+        modelos.append(ExpenseArchive)
+
+    totales = {} #(periodo, categoria) -> total
+    for modelo in modelos:
+        #Rango explicito sobre (user_id, expense_date): usa ix_expense_user_id_expense_date
+        filtros = filtros_rango(modelo, usuario_id, desde, hasta)
+
+        if db.get_bind().dialect.name == "postgresql":
+            periodo = func.date_trunc(granularidad, modelo.expense_date).label("periodo")
+            columnas = [periodo, func.sum(modelo.amount_cents).label("total")]
+            agrupar = [periodo]
+            if por_categoria:
+                columnas.append(Category.name.label("categoria"))
+                agrupar.append(Category.name)
+
+            consulta = db.query(*columnas)
+            if por_categoria:
+                consulta = consulta.join(Category, modelo.category_id == Category.id)
+            for r in consulta.filter(*filtros).group_by(*agrupar).all():
+                clave = (r.periodo.date(), r.categoria if por_categoria else None)
+                totales[clave] = totales.get(clave, 0) + int(r.total)
+        else:
+            #Otros motores (ej. SQLite local): se agrupa en Python
+            columnas = [modelo.expense_date, modelo.amount_cents]
+            if por_categoria:
+                columnas.append(Category.name.label("categoria"))
+
+            consulta = db.query(*columnas)
+            if por_categoria:
+                consulta = consulta.join(Category, modelo.category_id == Category.id)
+            for r in consulta.filter(*filtros).all():
+                clave = (truncar_fecha(r.expense_date, granularidad), r.categoria if por_categoria else None)
+                totales[clave] = totales.get(clave, 0) + r.amount_cents
+
+    categorias = sorted({c for _, c in totales if c is not None})
+
+    #Periodos sin gastos van en cero
+    data = []
+    periodo = truncar_fecha(desde, granularidad)
+    while periodo <= hasta:
+        if por_categoria:
+            por_nombre = {c: totales.get((periodo, c), 0) for c in categorias}
+            data.append({
+                "periodo": periodo,
+                "total": a_monto(sum(por_nombre.values())),
+                "categorias": {c: a_monto(total) for c, total in por_nombre.items()}
+            })
+        else:
+            data.append({
+                "periodo": periodo,
+                "total": a_monto(totales.get((periodo, None), 0))
+            })
+        periodo = siguiente_periodo(periodo, granularidad)
+
+    return {
+        "msg": "Serie de egresos",
+        "data": data
+    }
+
+def consulta_fts5(texto: str) -> str:
+    # Cada palabra entre comillas (sin sintaxis FTS5 del usuario) y como prefijo
+    return " ".join(f'"{palabra}"*' for palabra in re.findall(r"\w+", texto))
+
+@router.get("/buscar/{usuario_id}", dependencies=[Depends(verify_token)])
+@perfilable
+def buscar_egresos(
+    usuario_id: UUID,
+    q: str,
+    categoria_id: UUID | None = None,
+    desde: date | None = None,
+    hasta: date | None = None,
+    pagina: int = Query(1, ge=1),
+    tamano: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db_lectura)
+):
+    if not re.search(r"\w", q):
+        raise HTTPException(status_code=400, detail="La busqueda esta vacia")
+
+    filtros = [Expense.user_id == usuario_id]
+    if categoria_id:
+        filtros.append(Expense.category_id == categoria_id)
+    if desde:
+        filtros.append(Expense.expense_date >= datetime.combine(desde, time.min))
+    if hasta:
+        filtros.append(Expense.expense_date < datetime.combine(hasta + timedelta(days=1), time.min))
+
+    columnas = [
+        Expense.id,
+        Expense.description,
+        Expense.amount_cents,
+        Expense.expense_date,
+        Category.name.label("categoria")
+    ]
+
+    if db.get_bind().dialect.name == "postgresql":
+        #Indice GIN ix_expense_description_fts
+        busqueda = func.websearch_to_tsquery(literal_column("'spanish'::regconfig"), q)
+        rank = func.ts_rank(vector_descripcion(), busqueda).label("rank")
+        consulta = db.query(*columnas, rank).select_from(Expense).filter(vector_descripcion().op("@@")(busqueda))
+    else:
+        #SQLite: tabla FTS5 expense_fts (bm25 es menor cuanto mas relevante)
+        rank = literal_column("-bm25(expense_fts)").label("rank")
+        consulta = db.query(*columnas, rank).select_from(Expense).join(
+            expense_fts, expense_fts.c.rowid == literal_column("expense.rowid")
+        ).filter(literal_column("expense_fts").op("MATCH")(consulta_fts5(q)))
+
+    #Se pide uno de mas para saber si hay otra pagina sin contar el total
+    resultados_db = consulta.outerjoin(Category, Expense.category_id == Category.id
+                    ).filter(*filtros
+                    ).order_by(rank.desc(), Expense.expense_date.desc()
+                    ).offset((pagina - 1) * tamano
+                    ).limit(tamano + 1).all()
+
+    data = []
+    for r in resultados_db[:tamano]:
+        data.append({
+            "id": r.id,
+            "description": r.description,
+            "amount": a_monto(r.amount_cents),
+            "expense_date": r.expense_date,
+            "category": r.categoria,
+            "rank": float(r.rank)
+        })
+
+    return {
+        "msg": "Resultados de busqueda",
+        "data": data,
+        "pagina": pagina,
+        "tamano": tamano,
+        "hay_mas": len(resultados_db) > tamano
+    }
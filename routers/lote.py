@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from urllib.parse import urlsplit
+import json
+import os
+
+from database import engine_transaccional, session
+from invalidacion import bus, clave_usuario
+from models import Access_log
+from schemas import LoteRequest
+from security import verify_token
+
+router = APIRouter(prefix="/lote", tags=["Lote"])
+
+MAXIMO_OPERACIONES = int(os.getenv("BATCH_MAX_OPS", "20"))
+
+#Claves del scope que no se heredan de POST /lote (las pone el router de nuevo)
+CLAVES_PROPIAS = {"route", "endpoint", "path_params", "fastapi_astack", "fastapi_inner_astack", "fastapi_function_astack"}
+
+
+async def ejecutar_operacion(request: Request, operacion, token: str, contexto: dict) -> dict:
+    # Pasa la operacion por el router de la app sin los middlewares (ya corrieron para el lote)
+    partes = urlsplit(operacion.ruta)
+    cuerpo = b"" if operacion.cuerpo is None else json.dumps(operacion.cuerpo).encode("utf-8")
+    cabeceras = {k.lower(): v for k, v in operacion.cabeceras.items()}
+    cabeceras["x-token"] = token
+    cabeceras["token"] = token #budgets y admin leen esta cabecera
+    cabeceras["content-type"] = "application/json"
+    cabeceras["content-length"] = str(len(cuerpo))
+
+    scope = {k: v for k, v in request.scope.items() if k not in CLAVES_PROPIAS}
+    scope.update({
+        "method": operacion.metodo.upper(),
+        "path": partes.path,
+        "raw_path": partes.path.encode("utf-8"),
+        "query_string": partes.query.encode("utf-8"),
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in cabeceras.items()],
+        "lote": contexto,
+    })
+
+    enviado = False
+    async def recibir():
+        nonlocal enviado
+        if enviado:
+            return {"type": "http.disconnect"}
+        enviado = True
+        return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+    respuesta = {"status": 500, "cuerpo": b""}
+    async def enviar(mensaje):
+        if mensaje["type"] == "http.response.start":
+            respuesta["status"] = mensaje["status"]
+        elif mensaje["type"] == "http.response.body":
+            respuesta["cuerpo"] += mensaje.get("body", b"")
+
+    try:
+        await request.app.router(scope, recibir, enviar)
+    except StarletteHTTPException as error:
+        #Ruta inexistente o metodo no permitido: el router las lanza sin manejar
+        return {"ruta": operacion.ruta, "status": error.status_code, "data": {"detail": error.detail}}
+    except Exception as error:
+        return {"ruta": operacion.ruta, "status": 500, "data": {"detail": str(error)}}
+
+    try:
+        data = json.loads(respuesta["cuerpo"]) if respuesta["cuerpo"] else None
+    except ValueError:
+        data = respuesta["cuerpo"].decode("utf-8", "replace")
+    return {"ruta": operacion.ruta, "status": respuesta["status"], "data": data}
+
+
+@router.post("/")
+async def ejecutar_lote(lote: LoteRequest, request: Request, x_token: str = Header(...)):
+    if len(lote.operaciones) > MAXIMO_OPERACIONES:
+        raise HTTPException(status_code=400, detail=f"Maximo {MAXIMO_OPERACIONES} operaciones por lote")
+    if any(urlsplit(o.ruta).path.rstrip("/") == router.prefix for o in lote.operaciones):
+        raise HTTPException(status_code=400, detail="Un lote no puede contener otro lote")
+    if lote.transaccion and lote.continuar_en_error:
+        raise HTTPException(status_code=400, detail="continuar_en_error no se puede usar con transaccion")
+
+    conexion = None
+    if lote.transaccion:
+        # Los commit de cada ruta pasan a ser SAVEPOINT; el commit real es al final
+        conexion = engine_transaccional.connect()
+        transaccion = conexion.begin()
+        db = session(bind=conexion, join_transaction_mode="create_savepoint")
+    else:
+        db = session()
+    db.info["token"] = x_token
+    db.info["adherencia"] = request.scope.get("adherencia")
+
+    try:
+        #Una sola verificacion del token para todo el lote
+        await verify_token(request, x_token, db)
+        user_id = db.query(Access_log.user_id).filter(Access_log.id == x_token).scalar() #Sin objeto ORM: sobrevive al rollback
+        contexto = {"db": db, "token": x_token}
+
+        resultados = []
+        fallo = False
+        for operacion in lote.operaciones:
+            if fallo:
+                resultados.append({"ruta": operacion.ruta, "status": None, "data": None}) #No ejecutada
+                continue
+            resultado = await ejecutar_operacion(request, operacion, x_token, contexto)
+            resultados.append(resultado)
+            if resultado["status"] >= 400:
+                if not lote.transaccion:
+                    await run_in_threadpool(db.rollback) #Que la siguiente operacion arranque limpia
+                fallo = fallo or not lote.continuar_en_error
+
+        if lote.transaccion:
+            if fallo:
+                await run_in_threadpool(transaccion.rollback)
+            else:
+                await run_in_threadpool(transaccion.commit)
+            #Las rutas publicaron antes del commit real: se vuelve a invalidar ya confirmado, y
+            #tambien si se deshizo (un grafico del lote pudo cachear datos sin confirmar)
+            bus.publicar(clave_usuario(user_id))
+    finally:
+        db.close()
+        if conexion is not None:
+            conexion.close()
+
+    #Con continuar_en_error fallo queda en False aunque haya operaciones con error
+    con_errores = any(r["status"] is not None and r["status"] >= 400 for r in resultados)
+    return {
+        "msg": "Lote con errores" if con_errores else "Lote ejecutado",
+        "confirmado": not (lote.transaccion and fallo),
+        "data": resultados
+    }
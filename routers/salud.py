@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+
+from lifespan import estado
+
+router = APIRouter(prefix="/salud", tags=["Salud"])
+
+@router.get("/vivo")
+async def vivo():
+    # Liveness: el proceso responde, no toca la base de datos
+    return {"msg": "ok"}
+
+@router.get("/listo")
+async def listo():
+    # Readiness: pool calentado y caches cargadas, y no estamos apagando
+    if not estado.listo:
+        raise HTTPException(status_code=503, detail="No listo")
+
+    return {
+        "msg": "listo",
+        "en_vuelo": estado.en_vuelo
+    }
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import uuid
@@ -6,7 +7,9 @@ from pydantic import BaseModel
 import string
 import secrets
 
-from database import get_db
+from database import get_db, get_db_lectura
+from invalidacion import bus, clave_usuario
+from limites import limitar, comprobar_cuenta
 from models import User
 from security import verify_token
 from enviarCorreo.email import enviar_correo_confirmacion, enviar_correo_recuperacion, enviar_correo_contraseña
@@ -19,15 +22,17 @@ router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 class RecuperacionCuenta(BaseModel):
     email: str
 
-@router.post("/solicitar-recuperacion")
+@router.post("/solicitar-recuperacion", dependencies=[Depends(limitar("correo"))])
 async def solicitar_recuperacion(request: RecuperacionCuenta, db: Session = Depends(get_db)):
+    comprobar_cuenta("correo", request.email)
+
     usuario = db.query(User).filter(User.email == request.email).first()
 
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     token = str(uuid.uuid4())
-    enviar_correo_recuperacion(usuario.email, token)
+    await run_in_threadpool(enviar_correo_recuperacion, usuario.email, token)
 
     usuario.recovery_token = token
     usuario.recovery_token_expires = datetime.utcnow() + timedelta(minutes=15)
@@ -65,6 +70,7 @@ async def cambiar_password(data: CambiarPasswordRequest, db: Session = Depends(g
 
     usuario.updated_at = datetime.utcnow()
     db.commit()
+    bus.publicar(clave_usuario(usuario.id))
 
     return {
         "msg": "Contraseña actualizada correctamente"
@@ -83,37 +89,43 @@ async def cambiar_password_autorizado(request: CambiarPasswordAutorizadoRequest,
     usuario.password_hash = request.new_password
     usuario.updated_at = datetime.utcnow()
     db.commit()
+    bus.publicar(clave_usuario(usuario.id))
 
     return {
         "msg": "Contraseña actualizada correctamente"
     }
 
-@router.put("/cambiar-password-autorizado/{email}", dependencies=[Depends(verify_token)])
+@router.put("/cambiar-password-autorizado/{email}", dependencies=[Depends(limitar("correo")), Depends(verify_token)])
 async def cambiar_password_olvido(email: str, db: Session = Depends(get_db)):
+    comprobar_cuenta("correo", email)
+
     usuario = db.query(User).filter(User.email == email).first()
 
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     random_password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(10))
-    enviar_correo_contraseña(usuario.email, random_password)
+    await run_in_threadpool(enviar_correo_contraseña, usuario.email, random_password)
 
     usuario.password_hash = random_password
     usuario.updated_at = datetime.utcnow()
     db.commit()
+    bus.publicar(clave_usuario(usuario.id))
 
     return {
         "msg": "Contraseña actualizada correctamente"
     }
 
-@router.post("/confirmar-inicio-sesion")
+@router.post("/confirmar-inicio-sesion", dependencies=[Depends(limitar("correo"))])
 async def confirmar_inicio_sesion(email: str, db: Session = Depends(get_db)):
+    comprobar_cuenta("correo", email)
+
     usuario = db.query(User).filter(User.email == email).first()
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    enviar_correo_confirmacion(usuario.email)
+    await run_in_threadpool(enviar_correo_confirmacion, usuario.email)
 
     return {
         "msg": "Inicio de sesión confirmado",
@@ -125,7 +137,7 @@ async def confirmar_inicio_sesion(email: str, db: Session = Depends(get_db)):
 
 
 @router.get("/")
-def listar_usuarios(db: Session = Depends(get_db)):
+def listar_usuarios(db: Session = Depends(get_db_lectura)):
     usuarios = db.query(User).all()
     return [
         {
@@ -1,6 +1,19 @@
-from pydantic import BaseModel
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 from uuid import UUID
 
+#Los montos se guardan en centavos (enteros); la API sigue usando decimales
+def a_centavos(monto: float | None) -> int | None:
+    if monto is None:
+        return None
+    return int(Decimal(str(monto)).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def a_monto(centavos: int | None) -> float | None:
+    if centavos is None:
+        return None
+    return centavos / 100
+
 class EgresoType(BaseModel):
     id: str | None = None
     amount : float
@@ -14,6 +27,31 @@ class EgresoType(BaseModel):
     class Config:
         from_attributes = True
 
+    @property
+    def amount_cents(self) -> int:
+        return a_centavos(self.amount)
+
+class EgresoSalida(BaseModel):
+    id: UUID
+    amount: float | None = Field(None, validation_alias="amount_cents")
+    expense_date: datetime | None = None
+    description: str | None = None
+    is_recurring: bool | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    user_id: UUID | None = None
+    category_id: UUID | None = None
+    recurring_source_id: UUID | None = None
+    recurring_period: str | None = None
+
+    class Config:
+        from_attributes = True
+
+    @field_validator("amount", mode="before")
+    @classmethod
+    def desde_centavos(cls, valor):
+        return a_monto(valor)
+
 class UserListSchema(BaseModel):
     id: str
     full_name: str
@@ -31,9 +69,53 @@ class BudgetCreate(BaseModel):
     alert_treshold: float
     category_name:str
 
+    @property
+    def amount_limit_cents(self) -> int:
+        return a_centavos(self.amount_limit)
+
+class BudgetSalida(BaseModel):
+    id: UUID
+    amount_limit: float | None = Field(None, validation_alias="amount_limit_cents")
+    month: str | None = None
+    year: str | None = None
+    alert_treshold: float | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    user_id: UUID | None = None
+    category_id: UUID | None = None
+
+    class Config:
+        from_attributes = True
+
+    @field_validator("amount_limit", mode="before")
+    @classmethod
+    def desde_centavos(cls, valor):
+        return a_monto(valor)
+
 class EgresoUpdate(BaseModel):
     amount: float
     expense_date: str
     description: str | None = None
     is_recurring: bool | None = False
-    category_id: UUID
\ No newline at end of file
+    category_id: UUID
+
+    @property
+    def amount_cents(self) -> int:
+        return a_centavos(self.amount)
+
+class OperacionLote(BaseModel):
+    metodo: str = "GET"
+    ruta: str #Ruta de la API con query string, ej. "/egresos/usuario/<id>?desde=2026-01-01"
+    cuerpo: dict | list | None = None
+    cabeceras: dict[str, str] = {} #Ej. Idempotency-Key
+
+class LoteRequest(BaseModel):
+    operaciones: list[OperacionLote] = Field(..., min_length=1)
+    transaccion: bool = False #Todo o nada: si una operacion falla se deshacen las anteriores
+    continuar_en_error: bool = False #Solo sin transaccion
+
+class UsuarioImportado(BaseModel):
+    full_name: str = Field(validation_alias=AliasChoices("full_name", "name"))
+    email: str
+    password: str | None = None #Si falta se genera una y se envia por correo
+    role: str = "user"
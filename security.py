@@ -1,11 +1,15 @@
 import datetime
-from fastapi import Header, Depends, HTTPException
+from fastapi import Header, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
 from models import Access_log
 from database import get_db
 
-async def verify_token(x_token : str = Header(...), db: Session = Depends(get_db)):
+async def verify_token(request: Request, x_token : str = Header(...), db: Session = Depends(get_db)):
+    lote = request.scope.get("lote")
+    if lote and lote["token"] == x_token:
+        return x_token #Ya verificado al entrar a POST /lote
+
     db_query = db.query(Access_log).filter(Access_log.id == x_token)  
     db_acceso = db_query.first()
     if not db_acceso:
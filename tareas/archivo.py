@@ -0,0 +1,145 @@
+"""Mueve los gastos anteriores al horizonte a expense_archive, por lotes.
+
+Uso (ej. cron mensual):
+    python -m tareas.archivo --meses 24 --lote 5000
+
+Cada lote copia los gastos a expense_archive, suma sus totales mensuales en
+expense_rollup y los borra de expense, todo en la misma transaccion: un gasto
+esta siempre en una sola de las dos tablas. Los gastos que originan
+recurrentes no se archivan, la tarea de recurrentes los sigue necesitando.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+from sqlalchemy import insert, or_
+
+from database import session
+from invalidacion import bus
+from models import Expense, ExpenseArchive, ExpenseArchiveRun, ExpenseRollup
+from routers.egresos import CLAVE_ARCHIVO
+
+MESES_HORIZONTE = int(os.getenv("ARCHIVE_HORIZON_MONTHS", "24"))
+
+ARCHIVABLE = or_(
+    Expense.is_recurring.isnot(True),
+    Expense.recurring_source_id.isnot(None)
+)
+
+
+def calcular_horizonte(hoy: datetime.date, meses: int) -> datetime.datetime:
+    # Primer dia del mes, "meses" antes del actual
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    return datetime.datetime(total // 12, total % 12 + 1, 1)
+
+
+def sumar_totales(db, filas) -> None:
+    totales = {}
+    for f in filas:
+        clave = (f.user_id, f.category_id, f.expense_date.date().replace(day=1))
+        total, cantidad = totales.get(clave, (0, 0))
+        totales[clave] = (total + (f.amount_cents or 0), cantidad + 1)
+
+    existentes = {
+        (r.user_id, r.category_id, r.month): r
+        for r in db.query(ExpenseRollup).filter(
+            ExpenseRollup.user_id.in_({u for u, _, _ in totales}),
+            ExpenseRollup.month.in_({m for _, _, m in totales})
+        )
+    }
+    nuevos = []
+    for (usuario, categoria, mes), (total, cantidad) in totales.items():
+        fila = existentes.get((usuario, categoria, mes))
+        if fila:
+            fila.total_cents += total
+            fila.expense_count += cantidad
+        else:
+            nuevos.append({
+                "user_id": usuario,
+                "category_id": categoria,
+                "month": mes,
+                "total_cents": total,
+                "expense_count": cantidad,
+            })
+    if nuevos:
+        db.execute(insert(ExpenseRollup), nuevos)
+
+
+def ejecutar(meses: int = MESES_HORIZONTE, lote: int = 5000) -> dict:
+    horizonte = calcular_horizonte(datetime.date.today(), meses)
+    inicio = time.perf_counter()
+    db = session()
+    try:
+        corrida = db.query(ExpenseArchiveRun).filter(ExpenseArchiveRun.horizon == horizonte).first()
+        if not corrida:
+            corrida = ExpenseArchiveRun(horizon=horizonte)
+            db.add(corrida)
+        corrida.batches = 0
+        corrida.moved = 0
+        corrida.status = "en_curso"
+        corrida.started_at = datetime.datetime.now()
+        corrida.finished_at = None
+        db.commit()
+        #Desde aca las lecturas anteriores al horizonte tambien consultan el archivo
+        bus.publicar(CLAVE_ARCHIVO)
+
+        while True:
+            #Los mas viejos primero; en PostgreSQL solo se tocan las particiones viejas
+            filas = db.query(
+                Expense.id,
+                Expense.user_id,
+                Expense.category_id,
+                Expense.expense_date,
+                Expense.amount_cents,
+                Expense.description
+            ).filter(
+                Expense.expense_date < horizonte,
+                ARCHIVABLE
+            ).order_by(Expense.expense_date).limit(lote).with_for_update().all()
+            if not filas:
+                break
+
+            ahora = datetime.datetime.now()
+            db.execute(insert(ExpenseArchive), [
+                {**f._asdict(), "archived_at": ahora} for f in filas
+            ])
+            sumar_totales(db, filas)
+            db.query(Expense).filter(
+                Expense.id.in_([f.id for f in filas]),
+                Expense.expense_date < horizonte
+            ).delete(synchronize_session=False)
+
+            corrida.batches += 1
+            corrida.moved += len(filas)
+            db.commit()
+
+        corrida.status = "completado"
+        corrida.finished_at = datetime.datetime.now()
+        db.commit()
+        if corrida.moved:
+            bus.publicar(CLAVE_ARCHIVO) #Los gastos movidos ya no cuentan para los atipicos
+
+        return {
+            "horizonte": horizonte.date().isoformat(),
+            "estado": corrida.status,
+            "lotes": corrida.batches,
+            "archivados": corrida.moved,
+            "segundos": round(time.perf_counter() - inicio, 3),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva los gastos anteriores al horizonte")
+    parser.add_argument("--meses", type=int, default=MESES_HORIZONTE, help="Meses que quedan en expense")
+    parser.add_argument("--lote", type=int, default=5000, help="Gastos por lote")
+    args = parser.parse_args()
+
+    print(json.dumps(ejecutar(args.meses, args.lote), indent=2))
+
+
+if __name__ == "__main__":
+    main()
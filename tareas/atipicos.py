@@ -0,0 +1,219 @@
+"""Calcula los gastos atipicos de todos los usuarios por lotes.
+
+Uso:
+    python -m tareas.atipicos --procesos 8 --usuarios-por-lote 2000
+
+Lee los gastos ordenados por usuario en streaming, arma lotes de usuarios como
+arreglos de NumPy y los analiza en un pool de procesos. Las reglas son las de
+/egresos/{user_id}/atipicos; ademas guarda z-score, participacion de la
+categoria y media/desvio/mediana/p95 por usuario. La ruta lee estas tablas
+mientras los gastos del usuario no hayan cambiado desde el calculo.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import insert
+
+from database import session
+from models import Expense, ExpenseAnomaly, ExpenseAnomalyUser
+from routers.egresos import MINIMO_GASTOS, MAXIMO_POCO_FRECUENTE, ULTIMO_CAMBIO, mensaje_atipico
+
+MONTO_INUSUAL = 1
+CATEGORIA_POCO_FRECUENTE = 2
+
+
+def analizar(montos: np.ndarray, categorias: np.ndarray, inicios: np.ndarray) -> dict:
+    # Un lote de usuarios: filas ordenadas por usuario, inicios = primera fila de cada uno
+    total_filas = len(montos)
+    conteos = np.diff(np.append(inicios, total_filas))
+    usuario_fila = np.repeat(np.arange(len(inicios)), conteos)
+
+    sumas = np.add.reduceat(montos, inicios) #int64, exacto
+    n_fila = conteos[usuario_fila]
+
+    #monto > promedio * 1.5, en enteros igual que la ruta
+    inusual = montos * n_fila * 2 > sumas[usuario_fila] * 3
+
+    #Cantidad de gastos del usuario en la categoria de cada fila
+    pares = usuario_fila.astype(np.int64) * (int(categorias.max(initial=0)) + 1) + categorias
+    _, inverso, por_par = np.unique(pares, return_inverse=True, return_counts=True)
+    en_categoria = por_par[inverso]
+    poco_frecuente = en_categoria <= MAXIMO_POCO_FRECUENTE
+
+    analizable = n_fila >= MINIMO_GASTOS
+    flags = (inusual * MONTO_INUSUAL + poco_frecuente * CATEGORIA_POCO_FRECUENTE) * analizable
+
+    media = sumas / conteos
+    cuadrados = np.add.reduceat(montos.astype(np.float64) ** 2, inicios)
+    desvio = np.sqrt(np.maximum(cuadrados / conteos - media ** 2, 0))
+    desvio_fila = desvio[usuario_fila]
+    zscore = np.divide(montos - media[usuario_fila], desvio_fila, out=np.zeros(total_filas), where=desvio_fila > 0)
+
+    mediana = np.empty(len(inicios))
+    p95 = np.empty(len(inicios))
+    for i, (inicio, cantidad) in enumerate(zip(inicios, conteos)):
+        mediana[i], p95[i] = np.percentile(montos[inicio:inicio + cantidad], [50, 95])
+
+    marcadas = np.flatnonzero(flags)
+    return {
+        "filas": marcadas,
+        "flags": flags[marcadas],
+        "zscore": zscore[marcadas],
+        "participacion": (en_categoria / n_fila)[marcadas],
+        "media": media,
+        "desvio": desvio,
+        "mediana": mediana,
+        "p95": p95,
+    }
+
+
+class Lote:
+    # Lo que queda en el proceso principal para escribir los resultados
+    def __init__(self):
+        self.usuarios = []
+        self.ultimo_cambio = []
+        self.ids = []
+        self.montos = []
+        self.categorias = []
+        self.inicios = []
+
+    def agregar(self, user_id, expense_id, monto, categoria: int, cambio):
+        if not self.usuarios or self.usuarios[-1] != user_id:
+            self.usuarios.append(user_id)
+            self.ultimo_cambio.append(cambio)
+            self.inicios.append(len(self.ids))
+        elif cambio and (self.ultimo_cambio[-1] is None or cambio > self.ultimo_cambio[-1]):
+            self.ultimo_cambio[-1] = cambio
+        self.ids.append(expense_id)
+        self.montos.append(monto or 0)
+        self.categorias.append(categoria)
+
+    def arreglos(self):
+        return (
+            np.array(self.montos, dtype=np.int64),
+            np.array(self.categorias, dtype=np.int64),
+            np.array(self.inicios, dtype=np.int64),
+        )
+
+
+def leer_lotes(db, usuarios_por_lote: int, filas_por_lectura: int):
+    # Streaming ordenado por usuario (ix_expense_user_id_expense_date); nunca corta un usuario
+    codigos_categoria = {}
+    consulta = db.query(
+        Expense.user_id,
+        Expense.id,
+        Expense.amount_cents,
+        Expense.category_id,
+        ULTIMO_CAMBIO
+    ).order_by(Expense.user_id).execution_options(yield_per=filas_por_lectura)
+
+    lote = Lote()
+    for user_id, expense_id, monto, category_id, cambio in consulta:
+        if lote.usuarios and lote.usuarios[-1] != user_id and len(lote.usuarios) >= usuarios_por_lote:
+            yield lote
+            lote = Lote()
+        codigo = codigos_categoria.setdefault(category_id, len(codigos_categoria))
+        lote.agregar(user_id, expense_id, monto, codigo, cambio)
+    if lote.usuarios:
+        yield lote
+
+
+def guardar(db, lote: Lote, resultado: dict, ahora: datetime.datetime) -> int:
+    usuarios = lote.usuarios
+    db.query(ExpenseAnomaly).filter(ExpenseAnomaly.user_id.in_(usuarios)).delete(synchronize_session=False)
+    db.query(ExpenseAnomalyUser).filter(ExpenseAnomalyUser.user_id.in_(usuarios)).delete(synchronize_session=False)
+
+    inicios = np.array(lote.inicios)
+    anomalias = []
+    for fila, flags, zscore, participacion in zip(
+        resultado["filas"].tolist(), resultado["flags"].tolist(),
+        resultado["zscore"].tolist(), resultado["participacion"].tolist()
+    ):
+        usuario = usuarios[int(np.searchsorted(inicios, fila, side="right")) - 1]
+        nombres = []
+        if flags & MONTO_INUSUAL:
+            nombres.append("MONTO_INUSUAL")
+        if flags & CATEGORIA_POCO_FRECUENTE:
+            nombres.append("CATEGORIA_POCO_FRECUENTE")
+        anomalias.append({
+            "expense_id": lote.ids[fila],
+            "user_id": usuario,
+            "flags": ",".join(nombres),
+            "message": mensaje_atipico(bool(flags & MONTO_INUSUAL), bool(flags & CATEGORIA_POCO_FRECUENTE)),
+            "zscore": zscore,
+            "category_share": participacion,
+            "computed_at": ahora,
+        })
+    if anomalias:
+        db.execute(insert(ExpenseAnomaly), anomalias)
+
+    conteos = np.diff(np.append(inicios, len(lote.ids))).tolist()
+    db.execute(insert(ExpenseAnomalyUser), [
+        {
+            "user_id": usuario,
+            "expense_count": conteos[i],
+            "last_change_at": lote.ultimo_cambio[i],
+            "mean_cents": float(resultado["media"][i]),
+            "std_cents": float(resultado["desvio"][i]),
+            "median_cents": float(resultado["mediana"][i]),
+            "p95_cents": float(resultado["p95"][i]),
+            "computed_at": ahora,
+        }
+        for i, usuario in enumerate(usuarios)
+    ])
+    db.commit()
+    return len(anomalias)
+
+
+def ejecutar(procesos: int, usuarios_por_lote: int, filas_por_lectura: int = 50_000) -> dict:
+    inicio = time.perf_counter()
+    ahora = datetime.datetime.now()
+    lector = session()
+    escritor = session()
+    totales = {"usuarios": 0, "gastos": 0, "atipicos": 0, "lotes": 0}
+
+    def escribir(lote, futuro):
+        totales["atipicos"] += guardar(escritor, lote, futuro.result(), ahora)
+        totales["usuarios"] += len(lote.usuarios)
+        totales["gastos"] += len(lote.ids)
+        totales["lotes"] += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            pendientes = []
+            for lote in leer_lotes(lector, usuarios_por_lote, filas_por_lectura):
+                pendientes.append((lote, pool.submit(analizar, *lote.arreglos())))
+                #No leer mas de lo que el pool alcanza a procesar
+                while len(pendientes) >= procesos * 2:
+                    escribir(*pendientes.pop(0))
+            for pendiente in pendientes:
+                escribir(*pendiente)
+    finally:
+        lector.close()
+        escritor.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        **totales,
+        "segundos": round(segundos, 3),
+        "gastos_por_minuto": round(totales["gastos"] / segundos * 60) if segundos else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula gastos atipicos de todos los usuarios")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--usuarios-por-lote", type=int, default=2000)
+    parser.add_argument("--filas-por-lectura", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(json.dumps(ejecutar(args.procesos, args.usuarios_por_lote, args.filas_por_lectura), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Crea las particiones mensuales futuras de expense y desprende las viejas (PostgreSQL).
+
+Uso (ej. cron diario):
+    python -m tareas.particiones --meses 3
+    python -m tareas.particiones --desprender-antes 2022-01
+
+Cada particion cubre un mes: expense_pAAAA_MM. Si la particion por defecto ya
+tiene filas de ese mes, se mueven a la nueva antes de adjuntarla. Las
+particiones desprendidas quedan como tablas sueltas con el mismo nombre, para
+archivarlas o borrarlas sin tocar la tabla principal.
+"""
+import argparse
+import datetime
+import json
+
+from sqlalchemy import text
+
+from database import session
+
+TABLA = "expense"
+DEFECTO = "expense_p_default"
+
+CREAR = "CREATE TABLE {nombre} (LIKE expense INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+MOVER_DESDE_DEFECTO = f"""
+WITH movidas AS (
+    DELETE FROM {DEFECTO} WHERE expense_date >= :desde AND expense_date < :hasta RETURNING *
+)
+INSERT INTO {{nombre}} SELECT * FROM movidas
+"""
+ADJUNTAR = "ALTER TABLE expense ATTACH PARTITION {nombre} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+
+#Particiones adjuntas a expense con su limite inferior, sin la de defecto
+LISTAR = """
+SELECT c.relname AS nombre
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'expense'::regclass AND c.relname <> :defecto
+ORDER BY c.relname
+"""
+
+
+def inicio_mes(fecha: datetime.date) -> datetime.date:
+    return fecha.replace(day=1)
+
+
+def mes_siguiente(fecha: datetime.date) -> datetime.date:
+    return datetime.date(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1)
+
+
+def nombre_particion(mes: datetime.date) -> str:
+    return f"{TABLA}_p{mes.year:04d}_{mes.month:02d}"
+
+
+def asegurar_particion(db, mes: datetime.date) -> bool:
+    # Devuelve True si la creo; cada particion en su propia transaccion
+    nombre = nombre_particion(mes)
+    if db.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar() is not None:
+        return False
+
+    desde, hasta = mes, mes_siguiente(mes)
+    db.execute(text(CREAR.format(nombre=nombre)))
+    db.execute(text(MOVER_DESDE_DEFECTO.format(nombre=nombre)), {"desde": desde, "hasta": hasta})
+    db.execute(text(ADJUNTAR.format(nombre=nombre, desde=desde, hasta=hasta)))
+    db.commit()
+    return True
+
+
+def asegurar_particiones(db, desde: datetime.date, meses: int) -> list:
+    creadas = []
+    mes = inicio_mes(desde)
+    for _ in range(meses + 1):
+        if asegurar_particion(db, mes):
+            creadas.append(nombre_particion(mes))
+        mes = mes_siguiente(mes)
+    return creadas
+
+
+def desprender_anteriores(db, antes_de: datetime.date) -> list:
+    # Los nombres ordenan igual que los meses; solo se desprenden meses completos anteriores
+    limite = nombre_particion(inicio_mes(antes_de))
+    nombres = [
+        n for n in db.execute(text(LISTAR), {"defecto": DEFECTO}).scalars()
+        if n < limite
+    ]
+    for nombre in nombres:
+        db.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}"))
+        db.commit()
+    return nombres
+
+
+def ejecutar(meses: int = 3, desprender_antes: datetime.date | None = None) -> dict:
+    db = session()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            return {"omitida": True, "motivo": "expense solo esta particionada en PostgreSQL"}
+
+        creadas = asegurar_particiones(db, datetime.date.today(), meses)
+        desprendidas = desprender_anteriores(db, desprender_antes) if desprender_antes else []
+        return {"omitida": False, "creadas": creadas, "desprendidas": desprendidas}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantiene las particiones mensuales de expense")
+    parser.add_argument("--meses", type=int, default=3, help="Meses futuros a crear ademas del actual")
+    parser.add_argument("--desprender-antes", help="AAAA-MM: desprende las particiones de meses anteriores")
+    args = parser.parse_args()
+
+    desprender_antes = None
+    if args.desprender_antes:
+        desprender_antes = datetime.datetime.strptime(args.desprender_antes, "%Y-%m").date()
+
+    print(json.dumps(ejecutar(args.meses, desprender_antes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Genera las instancias del periodo para todos los gastos recurrentes.
+
+Uso (ej. cron el dia 1 de cada mes):
+    python -m tareas.recurrentes --periodo 2026-11 --lote 5000
+
+Cada lote es un INSERT ... SELECT sobre un rango de ids de los gastos origen,
+con NOT EXISTS para no duplicar. El avance queda en recurring_run, asi que una
+corrida interrumpida se reanuda donde quedo y repetirla no inserta nada nuevo.
+"""
+import argparse
+import calendar
+import datetime
+import json
+import time
+
+from sqlalchemy import text
+
+from database import session
+from invalidacion import bus
+from models import RecurringRun
+from tareas.particiones import asegurar_particion
+
+#Gastos que originan instancias: marcados como recurrentes y que no son a su vez una instancia
+FILTRO_ORIGEN = """
+    s.is_recurring = :verdadero
+    AND s.recurring_source_id IS NULL
+    AND s.expense_date < :inicio
+"""
+
+#Mismo dia del mes (o el ultimo dia si el mes es mas corto) y misma hora
+FECHA_POSTGRES = "(:inicio + (least(extract(day from s.expense_date)::int, :dias_mes) - 1) * interval '1 day' + s.expense_date::time)"
+FECHA_SQLITE = "datetime(date(:inicio, '+' || (min(cast(strftime('%d', s.expense_date) as integer), :dias_mes) - 1) || ' days') || ' ' || time(s.expense_date))"
+
+ID_POSTGRES = "gen_random_uuid()"
+ID_SQLITE = "lower(hex(randomblob(16)))" #Uuid de SQLAlchemy en SQLite: 32 caracteres hex
+
+INSERTAR = """
+INSERT INTO expense (
+    id, amount_cents, expense_date, description, is_recurring, created_at, updated_at,
+    user_id, category_id, recurring_source_id, recurring_period
+)
+SELECT
+    {id}, s.amount_cents, {fecha}, s.description, :falso, :ahora, :ahora,
+    s.user_id, s.category_id, s.id, :periodo
+FROM expense s
+WHERE {filtro}
+    AND s.id > :desde_id AND s.id <= :hasta_id
+    AND NOT EXISTS (
+        SELECT 1 FROM expense i
+        WHERE i.recurring_source_id = s.id AND i.recurring_period = :periodo
+            AND i.expense_date >= :inicio AND i.expense_date < :fin
+    )
+"""
+
+SIGUIENTE_LOTE = """
+SELECT s.id FROM expense s
+WHERE {filtro} AND s.id > :desde_id
+ORDER BY s.id
+LIMIT :lote
+"""
+
+#Uuid nulo: valido para la columna uuid de PostgreSQL y, con guiones, menor que cualquier
+#id hex de 32 caracteres en SQLite
+ID_INICIAL = "00000000-0000-0000-0000-000000000000"
+
+
+def rango_periodo(periodo: str):
+    anio, mes = (int(p) for p in periodo.split("-"))
+    inicio = datetime.datetime(anio, mes, 1)
+    dias_mes = calendar.monthrange(anio, mes)[1]
+    return inicio, dias_mes
+
+
+def periodo_siguiente(hoy: datetime.date) -> str:
+    mes = hoy.month % 12 + 1
+    anio = hoy.year + (1 if hoy.month == 12 else 0)
+    return f"{anio:04d}-{mes:02d}"
+
+
+def sentencias(dialecto: str):
+    if dialecto == "postgresql":
+        fecha, id_nuevo = FECHA_POSTGRES, ID_POSTGRES
+    else:
+        fecha, id_nuevo = FECHA_SQLITE, ID_SQLITE
+    insertar = text(INSERTAR.format(id=id_nuevo, fecha=fecha, filtro=FILTRO_ORIGEN))
+    siguiente = text(SIGUIENTE_LOTE.format(filtro=FILTRO_ORIGEN))
+    return insertar, siguiente
+
+
+def ejecutar(periodo: str, lote: int = 5000, forzar: bool = False) -> dict:
+    inicio_periodo, dias_mes = rango_periodo(periodo)
+    inicio = time.perf_counter()
+    db = session()
+    try:
+        corrida = db.query(RecurringRun).filter(RecurringRun.period == periodo).first()
+        if corrida and corrida.status == "completado" and not forzar:
+            return reporte(corrida, reanudada=False, omitida=True, segundos=0.0)
+
+        reanudada = corrida is not None and corrida.status == "en_curso"
+        if not corrida:
+            corrida = RecurringRun(period=periodo, batches=0, inserted=0)
+            db.add(corrida)
+        if not reanudada:
+            corrida.last_source_id = ID_INICIAL
+            corrida.batches = 0
+            corrida.inserted = 0
+        corrida.status = "en_curso"
+        corrida.started_at = datetime.datetime.now()
+        corrida.finished_at = None
+        db.commit()
+
+        dialecto = db.get_bind().dialect.name
+        if dialecto == "postgresql":
+            #Que las instancias caigan en la particion del mes y no en la de defecto
+            asegurar_particion(db, inicio_periodo.date())
+
+        insertar, siguiente = sentencias(dialecto)
+        parametros = {
+            "verdadero": True,
+            "falso": False,
+            "inicio": inicio_periodo,
+            "fin": inicio_periodo + datetime.timedelta(days=dias_mes),
+            "dias_mes": dias_mes,
+            "periodo": periodo,
+        }
+
+        while True:
+            ids = db.execute(siguiente, {**parametros, "desde_id": corrida.last_source_id, "lote": lote}).scalars().all()
+            if not ids:
+                break
+
+            resultado = db.execute(insertar, {
+                **parametros,
+                "desde_id": corrida.last_source_id,
+                "hasta_id": ids[-1],
+                "ahora": datetime.datetime.now(),
+            })
+
+            #Instancias y avance en la misma transaccion: si se corta, se reanuda desde aqui
+            corrida.last_source_id = str(ids[-1])
+            corrida.batches += 1
+            corrida.inserted += max(resultado.rowcount, 0)
+            db.commit()
+
+        corrida.status = "completado"
+        corrida.finished_at = datetime.datetime.now()
+        db.commit()
+        if corrida.inserted:
+            bus.publicar("*") #Gastos nuevos para muchos usuarios a la vez
+
+        return reporte(corrida, reanudada=reanudada, omitida=False, segundos=time.perf_counter() - inicio)
+    finally:
+        db.close()
+
+
+def reporte(corrida: RecurringRun, reanudada: bool, omitida: bool, segundos: float) -> dict:
+    return {
+        "periodo": corrida.period,
+        "estado": corrida.status,
+        "omitida": omitida,
+        "reanudada": reanudada,
+        "lotes": corrida.batches,
+        "insertados": corrida.inserted,
+        "segundos": round(segundos, 3),
+        "inicio": corrida.started_at.isoformat() if corrida.started_at else None,
+        "fin": corrida.finished_at.isoformat() if corrida.finished_at else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materializa los gastos recurrentes de un periodo")
+    parser.add_argument("--periodo", default=periodo_siguiente(datetime.date.today()), help="YYYY-MM (por defecto el mes siguiente)")
+    parser.add_argument("--lote", type=int, default=5000, help="Gastos origen por lote")
+    parser.add_argument("--forzar", action="store_true", help="Vuelve a recorrer un periodo ya completado")
+    args = parser.parse_args()
+
+    print(json.dumps(ejecutar(args.periodo, args.lote, args.forzar), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import datetime
+import os
+import sys
+import tempfile
+import uuid
+
+#La base se elige al importar database: tiene que quedar configurada antes
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pruebas.db")
+os.environ.pop("DATABASE_REPLICA_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import database
+import models
+from notificaciones import evaluar_presupuesto
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.create_all(database.engine)
+    sesion = database.session()
+    try:
+        yield sesion
+    finally:
+        sesion.rollback()
+        sesion.close()
+
+
+def test_mover_egreso_de_presupuesto_conserva_la_alerta(db):
+    # Un egreso editado pasa del presupuesto A al B: la alerta de A se borra y la de B no se pierde
+    usuario = models.User(id=uuid.uuid4(), email="prueba@local", full_name="Prueba")
+    categoria_a = models.Category(id=uuid.uuid4(), name="A")
+    categoria_b = models.Category(id=uuid.uuid4(), name="B")
+    db.add_all([usuario, categoria_a, categoria_b])
+    db.flush()
+    presupuesto_a = models.Budget(id=uuid.uuid4(), user_id=usuario.id, category_id=categoria_a.id,
+                                  month="3", year="2031", amount_limit_cents=1000, alert_treshold=0.8)
+    presupuesto_b = models.Budget(id=uuid.uuid4(), user_id=usuario.id, category_id=categoria_b.id,
+                                  month="3", year="2031", amount_limit_cents=1000, alert_treshold=0.8)
+    fecha = datetime.datetime(2031, 3, 5)
+    egreso = models.Expense(id=uuid.uuid4(), user_id=usuario.id, category_id=categoria_a.id,
+                            amount_cents=900, expense_date=fecha, created_at=datetime.datetime.now())
+    db.add_all([presupuesto_a, presupuesto_b, egreso])
+    db.flush()
+    assert evaluar_presupuesto(db, usuario.id, categoria_a.id, fecha).budget_id == presupuesto_a.id
+    db.commit()
+
+    #Igual que editar_egreso: primero el mes/categoria anterior, despues el nuevo
+    egreso.category_id = categoria_b.id
+    db.flush()
+    evaluar_presupuesto(db, usuario.id, categoria_a.id, fecha)
+    evaluar_presupuesto(db, usuario.id, categoria_b.id, fecha)
+    db.commit()
+
+    alertas = db.query(models.Alert).filter(models.Alert.user_id == usuario.id).all()
+    assert [a.budget_id for a in alertas] == [presupuesto_b.id]